@@ -0,0 +1,284 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+from keboola.component.exceptions import UserException
+from keboola.http_client.async_client import AsyncHttpClient
+
+from common.src import serialization
+from common.src.cache import ResponseCache
+from common.src.esg_client import (
+    BATCHE_SIZE,
+    BatchProgress,
+    CompressedBodies,
+    EsgEndpoints,
+    build_ui_payload,
+    get_base_url,
+    get_body_size,
+    pending_batches,
+    take_first_batch,
+)
+from common.src.generic_rows import GenericRows
+from common.src.http_session import DEFAULT_READ_TIMEOUT
+from common.src.metrics import PerformanceMetrics, response_counters
+from common.src.rate_limit import THROTTLING_STATUS_CODES, AdaptiveRateLimiter, RetryPolicy
+from common.src.streaming import SpooledBody, iter_json
+from common.src.token_provider import TokenProvider
+
+DEFAULT_MAX_CONCURRENCY = 10
+# the request was not sent yet when these errors occur, so even an import can be sent again
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class AsyncEsgClient(CompressedBodies, EsgEndpoints, AsyncHttpClient):
+    """Asyncio variant of EsgClient with the same method surface, all methods are awaitable.
+
+    At most `max_concurrency` requests are in flight at once, further requests wait for a free slot.
+    The rate limiter may lower that limit while the API throttles the requests.
+    Use the client as an async context manager, so its connections are closed at the end.
+    """
+
+    def __init__(
+        self,
+        component_id: str,
+        id_token: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        token_provider: Optional[TokenProvider] = None,
+        timeout: float = DEFAULT_READ_TIMEOUT,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        content_encoding: Optional[str] = None,
+        metrics: Optional[PerformanceMetrics] = None,
+    ):
+        # responses are retried by the retry policy, not by the underlying client
+        super().__init__(base_url=get_base_url(component_id), retries=0, timeout=timeout)
+        if id_token:
+            self._auth_header["Authorization"] = f"Bearer {id_token}"
+        self.cache = cache or ResponseCache(ttl=0)
+        self.token_provider = token_provider
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(max_concurrency=max_concurrency)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or PerformanceMetrics()
+        self.init_compression(content_encoding)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # the response of an import is awaited without a read timeout, see `EsgClient`
+        self.import_timeout = httpx.Timeout(timeout, read=None)
+
+    async def _send(self, method: Callable, endpoint_path: str, **kwargs) -> httpx.Response:
+        """Send the request within the rate limits, retrying throttled and failed requests with backoff.
+
+        A spooled body is streamed from its temporary file again for each attempt, a rejected compressed body
+        is sent again uncompressed, see `EsgClient._send`. Requests with a body are sent again after a transport error
+        only when they did not reach the server, and after an error status only when the server refused them.
+        """
+        body = kwargs.get("content")
+        retried_errors = CONNECTION_ERRORS if body is not None else httpx.TransportError
+        headers = kwargs.pop("headers", None) or {}
+        attempt = 0
+        while True:
+            if isinstance(body, SpooledBody):
+                kwargs["content"] = body.aiter_chunks()
+                kwargs["headers"] = {**headers, **body.headers}
+            elif headers:
+                kwargs["headers"] = headers
+
+            async with self._slots:
+                await self.rate_limiter.acquire_async()
+                throttled = False
+                try:
+                    response = await self._timed_request(method, endpoint_path, body, **kwargs)
+                    self._is_encoding_rejected(body, response)
+                    return response
+                except httpx.HTTPStatusError as e:
+                    throttled = e.response.status_code in THROTTLING_STATUS_CODES
+                    if self._is_encoding_rejected(body, e.response):
+                        continue
+                    error, retry_after = f"status code {e.response.status_code}", e.response.headers.get("Retry-After")
+                    if not self.retry_policy.should_retry(e.response.status_code, attempt, body is None, retry_after):
+                        raise
+                except retried_errors as e:
+                    if attempt >= self.retry_policy.max_retries:
+                        raise
+                    error, retry_after = str(e) or type(e).__name__, None
+                finally:
+                    self.rate_limiter.release(throttled)
+
+            delay = self.retry_policy.get_delay(attempt, retry_after)
+            logging.warning(f"Request to {endpoint_path} failed with {error}, retrying in {delay:.1f} s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _timed_request(self, method: Callable, endpoint_path: str, body: Any, **kwargs) -> httpx.Response:
+        """Send the request once, recording its duration and size also when it fails with an error status."""
+        with self.metrics.stage("http_send", endpoint_path) as counters:
+            try:
+                response = await method(endpoint_path, **kwargs)
+            except httpx.HTTPStatusError as e:
+                counters.update(response_counters(get_body_size(body), e.response))
+                raise
+            counters.update(response_counters(get_body_size(body), response))
+            return response
+
+    async def _make_request(
+        self, method: Callable, endpoint_path: str, error_message: str, **kwargs
+    ) -> Dict[str, Any]:
+        if self.token_provider:
+            id_token = await asyncio.to_thread(self.token_provider.get_id_token)
+            self._auth_header["Authorization"] = f"Bearer {id_token}"
+
+        try:
+            response = await self._send(method, endpoint_path, **kwargs)
+
+            if response.status_code != 200:
+                raise UserException(
+                    f"Request to {endpoint_path} failed with status code {response.status_code},"
+                    f"{response.text}"
+                )
+
+            # Handle empty response
+            if not response.text:
+                return {
+                    "status": "success",
+                    "message": f"Request to {endpoint_path} completed successfully",
+                }
+
+            return serialization.loads(response.content)
+        except Exception as e:
+            try:
+                title = e.response.json().get("title")
+                message = ""
+                for k, v in e.response.json().get("errors").items():
+                    message += f"{k}: {v}\n"
+
+                raise UserException(f"{error_message}\n {title}\n {message}")
+            except Exception:
+                raise UserException(f"{error_message}: {e}")
+
+    async def _make_cached_request(
+        self, endpoint_path: str, error_message: str, params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """GET request whose response is served from the cache while it is fresh."""
+        key = endpoint_path
+        if params:
+            key += "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.debug(f"Using cached response of {key}")
+            return cached
+
+        kwargs = {"params": params} if params else {}
+        response = await self._make_request(self.get_raw, endpoint_path, error_message, **kwargs)
+        self.cache.set(key, response)
+        return response
+
+    async def _import_ui_data(
+        self,
+        endpoint: str,
+        entity_id: int,
+        reporting_period_id: int,
+        template_data: Any,
+        data_not_available: bool = False,
+        data_not_available_comment: Optional[str] = None,
+        **extra_fields,
+    ) -> Dict[str, Any]:
+        """Base method for importing UI data with common payload structure.
+
+        The payload is spooled before sending, so a failed request can be retried.
+        """
+        payload = build_ui_payload(
+            entity_id,
+            reporting_period_id,
+            template_data,
+            data_not_available,
+            data_not_available_comment,
+            **extra_fields,
+        )
+
+        with self.metrics.stage("serialize"):
+            body = SpooledBody(iter_json(payload), content_encoding=self.content_encoding)
+        with body:
+            result = await self._make_request(
+                self.post_raw,
+                endpoint,
+                f"Failed to import data to {endpoint}",
+                content=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self.import_timeout,
+            )
+            self._record_body_size(body)
+            return result
+
+    async def import_generic_data_in_batches(
+        self,
+        entity_id: int,
+        reporting_period_id: int,
+        template_id: int,
+        data: Iterable[Dict[str, Any]],
+        batch_size: int = BATCHE_SIZE,
+        max_concurrent_batches: int = 1,
+        progress: Optional[BatchProgress] = None,
+        append: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Import generic template data in batches, see `EsgClient.import_generic_data_in_batches`.
+
+        The next batch is read from `data` only once a slot for it is free, so a slow API holds back
+        reading of the input instead of piling the batches up in memory. A failed batch stops sending of the next ones,
+        the batches in flight are awaited and recorded in `progress` before the first error is raised.
+        """
+        if batch_size < 1:
+            raise UserException("Batch size must be a positive number.")
+
+        progress = progress or BatchProgress()
+        data = GenericRows.from_dicts(data)
+        batches = pending_batches(data.rows, batch_size, progress)
+        results = []
+        if not progress.acknowledged and not append:
+            first_batch, more_batches, batches = take_first_batch(batches)
+            results.append(
+                await self.import_generic_data(
+                    entity_id,
+                    reporting_period_id,
+                    template_id,
+                    GenericRows(data.columns, first_batch),
+                    append=False if more_batches else None,
+                )
+            )
+            progress.done(0)
+
+        slots = asyncio.Semaphore(max(max_concurrent_batches, 1))
+        failed = False
+
+        async def send(index: int, batch: List[tuple]) -> Dict[str, Any]:
+            nonlocal failed
+            try:
+                result = await self.import_generic_data(
+                    entity_id, reporting_period_id, template_id, GenericRows(data.columns, batch), append=True
+                )
+            except Exception:
+                failed = True
+                raise
+            finally:
+                slots.release()
+            progress.done(index)
+            return result
+
+        tasks = []
+        try:
+            while not failed:
+                await slots.acquire()
+                batch = next(batches, None)
+                if batch is None or failed:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(send(*batch)))
+        finally:
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if errors:
+            raise errors[0]
+        results.extend(outcomes)
+        return results
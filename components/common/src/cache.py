@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_TTL = 3600
+DEFAULT_MAX_ENTRIES = 64
+
+
+class ResponseCache:
+    """TTL cache of API responses backed by a JSON serializable dict, so it can be kept in the state file.
+
+    Entries older than `ttl` seconds are ignored and dropped on serialization. When the cache grows over
+    `max_entries`, the oldest entries are evicted first. Entries may be set from several threads at once.
+    """
+
+    def __init__(
+        self,
+        entries: Optional[Dict[str, Any]] = None,
+        ttl: int = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = dict(entries or {})
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("stored_at", 0) < self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or not self._is_fresh(entry):
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = {"stored_at": time.time(), "value": value}
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k].get("stored_at", 0))
+                del self._entries[oldest]
+
+    def invalidate(self, prefix: str = "") -> None:
+        """Drop all entries whose key starts with the prefix, everything by default."""
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            del self._entries[key]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: entry for key, entry in self._entries.items() if self._is_fresh(entry)}
@@ -0,0 +1,58 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from common.src.esg_client import BatchProgress
+
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+
+def file_fingerprint(path: str, *extra: Any) -> str:
+    """SHA-256 of the file content and the extra values, e.g. settings that change how the rows are batched."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(FINGERPRINT_CHUNK_SIZE):
+            digest.update(chunk)
+    for value in extra:
+        digest.update(f"|{value}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class UploadCheckpoints:
+    """Progress of the batched uploads, backed by a JSON serializable dict, so it can be kept in the state file.
+
+    A checkpoint is valid only for the input it was recorded with, identified by its fingerprint.
+    When the input changes, the upload starts from the first batch again.
+    """
+
+    def __init__(self, entries: Optional[Dict[str, Any]] = None):
+        self._entries = dict(entries or {})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(template_id: Any, entity_id: Any, reporting_period_id: Any) -> str:
+        return f"{template_id}-{entity_id}-{reporting_period_id}"
+
+    def progress(self, key: str, fingerprint: str) -> BatchProgress:
+        """Progress of the upload recorded by a previous run, further progress is recorded back here."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or entry.get("fingerprint") != fingerprint:
+            entry = {}
+        return BatchProgress(
+            entry.get("batches", 0),
+            entry.get("completed", []),
+            on_progress=lambda batches, completed: self.set(key, fingerprint, batches, completed),
+        )
+
+    def set(self, key: str, fingerprint: str, batches: int, completed: List[int]) -> None:
+        with self._lock:
+            self._entries[key] = {"fingerprint": fingerprint, "batches": batches, "completed": completed}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._entries)
@@ -0,0 +1,128 @@
+import collections
+import logging
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+NUMBER_COLUMN_TYPES = {"number", "decimal", "percentage", "currency"}
+INTEGER_COLUMN_TYPES = {"integer"}
+BOOLEAN_COLUMN_TYPES = {"boolean"}
+
+
+class CoercionError(ValueError):
+    """The value cannot be converted to the column type without changing it."""
+
+
+def to_bool(value: str) -> bool:
+    return value.lower() == "true"
+
+
+def to_float_or_zero(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _to_decimal(value: str) -> Decimal:
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise CoercionError(f"'{value}' is not a number")
+    if not number.is_finite():
+        raise CoercionError(f"'{value}' is not a finite number")
+    return number
+
+
+def to_number_string(value: str) -> str:
+    """Normalize a number to its plain decimal notation without trailing zeros, e.g. `10.50` to `10.5`.
+
+    The digits are kept exactly, empty values stay empty.
+    """
+    if not value.strip():
+        return value
+    return format(_to_decimal(value).normalize(), "f")
+
+
+def to_integer_string(value: str) -> str:
+    """Normalize a whole number, e.g. `3.0` to `3`, numbers with a fraction are not rounded."""
+    if not value.strip():
+        return value
+    number = _to_decimal(value)
+    if number != number.to_integral_value():
+        raise CoercionError(f"'{value}' is not a whole number")
+    return format(number.normalize(), "f")
+
+
+def to_bool_string(value: str) -> str:
+    lowered = value.strip().lower()
+    if not lowered:
+        return value
+    if lowered in ("true", "1", "yes"):
+        return "true"
+    if lowered in ("false", "0", "no"):
+        return "false"
+    raise CoercionError(f"'{value}' is not a boolean")
+
+
+class CoercionPlan:
+    """Per-column converters compiled once and applied to the rows.
+
+    The plan replaces the hand-written per-key casts of the endpoints and normalizes the values of generic
+    templates, it does not make the conversion faster: every value is still converted by a Python call.
+    Each row is copied and only the columns of the plan are converted, the other values are kept as they are.
+    Converters raising `CoercionError` leave the value unchanged, such values are counted per column and
+    reported in a warning once all rows are converted. Other errors of the converters are raised.
+    """
+
+    def __init__(self, converters: Dict[str, Callable[[Any], Any]]):
+        self.converters = converters
+
+    @classmethod
+    def from_template(cls, template: Dict[str, Any]) -> "CoercionPlan":
+        """Compile a plan for generic template data from its `columnType` and `numberCondition` metadata.
+
+        Generic template values are sent as strings, so the converters only normalize their representation.
+        Columns are matched by both their `dbColumnName` and `excelColumnName`.
+        """
+        converters = {}
+        for column in template.get("columnsConfiguration", []):
+            column_type = str(column.get("columnType") or "").replace(" ", "").lower()
+            number_condition = str(column.get("numberCondition") or "").lower()
+
+            if column_type in NUMBER_COLUMN_TYPES and "integer" in number_condition:
+                converter = to_integer_string
+            elif column_type in INTEGER_COLUMN_TYPES:
+                converter = to_integer_string
+            elif column_type in NUMBER_COLUMN_TYPES:
+                converter = to_number_string
+            elif column_type in BOOLEAN_COLUMN_TYPES:
+                converter = to_bool_string
+            else:
+                continue
+
+            for name in (column.get("dbColumnName"), column.get("excelColumnName")):
+                if name:
+                    converters[name] = converter
+
+        return cls(converters)
+
+    def apply(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Lazily convert the rows, missing values of ragged CSV rows are left as they are."""
+        converters = tuple(self.converters.items())
+        unconverted = collections.Counter()
+        for row in rows:
+            row = dict(row)
+            for column, converter in converters:
+                value = row.get(column)
+                if value is not None:
+                    try:
+                        row[column] = converter(value)
+                    except CoercionError:
+                        unconverted[column] += 1
+            yield row
+
+        if unconverted:
+            counts = ", ".join(f"{column}: {count}" for column, count in sorted(unconverted.items()))
+            logging.warning(
+                f"Values not matching the column types were sent unchanged, number of values per column: {counts}"
+            )
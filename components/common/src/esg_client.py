@@ -1,8 +1,23 @@
-from typing import Any, Callable, Dict, List, Optional
-
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import requests
 from keboola.component.exceptions import UserException
 from keboola.http_client import HttpClient
 
+from common.src import serialization
+from common.src.cache import ResponseCache
+from common.src.generic_rows import GenericRows
+from common.src.http_session import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, create_session
+from common.src.metrics import PerformanceMetrics, response_counters
+from common.src.rate_limit import THROTTLING_STATUS_CODES, AdaptiveRateLimiter, RetryPolicy
+from common.src.streaming import SpooledBody, get_content_encoding, iter_json
+from common.src.token_provider import TokenProvider
+
 ENDPOINT_GET_CLIENTS = "ExternalIntegration/ClientData/GetClientIds"
 ENDPOINT_GET_ENTITIES_WITH_PERIODS = (
     "ExternalIntegration/ClientData/GetEntitiesWithReportingPeriods"
@@ -39,116 +54,130 @@ ENDPOINT_IMPORT_LOCATIONS_UI_DATA = (
 ENDPOINT_IMPORT_GENERIC_DATA = "ExternalIntegration/TemplateData/ImportGenericData"
 
 BATCHE_SIZE = 100
+# a server that does not understand compressed request bodies answers with 415, or with 400 and an error
+# message mentioning the encoding, other 400 responses are ordinary validation errors
+ENCODING_REJECTED_STATUS_CODE = 415
+ENCODING_ERROR_PATTERN = re.compile(r"encoding|compress|gzip|deflate|brotli", re.IGNORECASE)
 
 
-class EsgClient(HttpClient):
-    def __init__(self, component_id: str, id_token: Optional[str] = None):
-
-        if "-stage" in component_id:
-            base_url = "https://esg-externalintegrationapi-keboola-stg.azurewebsites.net/api/"
-        else:
-            base_url = "https://esg-externalintegrationapi-keboola-prod.azurewebsites.net/api/"
-
-        super().__init__(base_url=base_url, max_retries=3)
-        if id_token:
-            self.update_auth_header({"Authorization": f"Bearer {id_token}"})
+def chunked(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
-    def _make_request(
-        self, method: Callable, endpoint_path: str, error_message: str, **kwargs
-    ) -> Dict[str, Any]:
-        try:
-            response = method(endpoint_path=endpoint_path, **kwargs)
-            response.raise_for_status()
-
-            if response.status_code != 200:
-                raise UserException(
-                    f"Request to {endpoint_path} failed with status code {response.status_code},"
-                    f"{response.text}"
-                )
-
-            # Handle empty response
-            if not response.text:
-                return {
-                    "status": "success",
-                    "message": f"Request to {endpoint_path} completed successfully",
-                }
 
-            return response.json()
-        except Exception as e:
-            try:
-                title = e.response.json().get("title")
-                message = ""
-                for k, v in e.response.json().get("errors").items():
-                    message += f"{k}: {v}\n"
+class BatchProgress:
+    """Tracks which batches of an upload were acknowledged by the API, the batches may complete in any order.
 
-                raise UserException(f"{error_message}\n {title}\n {message}")
-            except Exception:
-                raise UserException(f"{error_message}: {e}")
+    The progress is kept as the number of batches acknowledged in order plus the indices of the batches
+    completed after a gap, so a resumed upload sends neither of them again. `on_progress` is called with
+    both whenever a batch completes.
+    """
 
-    def _import_ui_data(
+    def __init__(
         self,
-        endpoint: str,
-        entity_id: int,
-        reporting_period_id: int,
-        template_data: Any,
-        data_not_available: bool = False,
-        data_not_available_comment: Optional[str] = None,
+        acknowledged: int = 0,
+        completed: Iterable[int] = (),
+        on_progress: Optional[Callable[[int, List[int]], None]] = None,
+    ):
+        self.acknowledged = acknowledged
+        self.completed = set(completed)
+        self.on_progress = on_progress
+
+    def is_done(self, index: int) -> bool:
+        return index < self.acknowledged or index in self.completed
+
+    def done(self, index: int) -> None:
+        self.completed.add(index)
+        while self.acknowledged in self.completed:
+            self.completed.remove(self.acknowledged)
+            self.acknowledged += 1
+        if self.on_progress:
+            self.on_progress(self.acknowledged, sorted(self.completed))
+
+
+def pending_batches(rows: Iterable[Any], size: int, progress: BatchProgress) -> Iterator[tuple]:
+    """Numbered batches of the rows, leaving out the batches already done."""
+    rows = islice(rows, progress.acknowledged * size, None)
+    for index, batch in enumerate(chunked(rows, size), start=progress.acknowledged):
+        if not progress.is_done(index):
+            yield index, batch
+
+
+def take_first_batch(batches: Iterator[tuple]) -> tuple[List[Any], bool, Iterator[tuple]]:
+    """Split the first batch off the numbered batches, an empty table still gives an empty first batch.
+
+    Returns:
+        Rows of the first batch, whether more batches follow, and the numbered batches following it
+    """
+    _, first_batch = next(batches, (0, []))
+    following = next(batches, None)
+    if following is None:
+        return first_batch, False, iter(())
+    return first_batch, True, chain([following], batches)
+
+
+def get_body_size(body: Any) -> int:
+    """Size of the request body as sent, after compression."""
+    if isinstance(body, SpooledBody):
+        return body.sent_size
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return 0
+
+
+def get_base_url(component_id: str) -> str:
+    if "-stage" in component_id:
+        return "https://esg-externalintegrationapi-keboola-stg.azurewebsites.net/api/"
+    return "https://esg-externalintegrationapi-keboola-prod.azurewebsites.net/api/"
+
+
+def build_ui_payload(
+    entity_id: int,
+    reporting_period_id: int,
+    template_data: Any,
+    data_not_available: bool = False,
+    data_not_available_comment: Optional[str] = None,
+    **extra_fields,
+) -> Dict[str, Any]:
+    return {
+        "entityId": entity_id,
+        "clientReportingPeriodId": reporting_period_id,
+        "templateData": template_data,
+        "dataNotAvailable": data_not_available,
+        "dataNotAvailableComment": data_not_available_comment,
         **extra_fields,
-    ) -> Dict[str, Any]:
-        """Base method for importing UI data with common payload structure.
+    }
 
-        Args:
-            endpoint: The API endpoint to use
-            entity_id: The entity ID
-            reporting_period_id: The reporting period ID
-            template_data: The data to import
-            data_not_available: Whether data is not available
-            data_not_available_comment: Comment for unavailable data
-            **extra_fields: Additional fields to include in the payload
 
-        Returns:
-            Dict containing the response or success message
-        """
-        payload = {
-            "entityId": entity_id,
-            "clientReportingPeriodId": reporting_period_id,
-            "templateData": template_data,
-            "dataNotAvailable": data_not_available,
-            "dataNotAvailableComment": data_not_available_comment,
-            **extra_fields,
-        }
+class EsgEndpoints:
+    """ESG API endpoints shared by the synchronous and the asynchronous client.
 
-        return self._make_request(
-            self.post_raw,
-            endpoint,
-            f"Failed to import data to {endpoint}",
-            json=payload,
-        )
+    The methods only build the request and return the result of `_make_cached_request` or `_import_ui_data`
+    of the client, which is a coroutine in case of the asynchronous client.
+    """
 
     def get_clients(self) -> Dict[str, Any]:
-        return self._make_request(
-            self.get_raw, ENDPOINT_GET_CLIENTS, "Failed to retrieve clients"
+        return self._make_cached_request(
+            ENDPOINT_GET_CLIENTS, "Failed to retrieve clients"
         )
 
     def get_entities_with_periods(self, client_id: str) -> Dict[str, Any]:
-        return self._make_request(
-            self.get_raw,
+        return self._make_cached_request(
             ENDPOINT_GET_ENTITIES_WITH_PERIODS,
             "Failed to retrieve clients",
             params={"clientId": client_id},
         )
 
     def get_entities(self, client_id: str) -> Dict[str, Any]:
-        return self._make_request(
-            self.get_raw,
+        return self._make_cached_request(
             ENDPOINT_GET_ENTITIES,
             "Failed to retrieve entities",
             params={"clientId": client_id},
         )
 
     def get_reporting_periods(self, client_id: str) -> Dict[str, Any]:
-        return self._make_request(
-            self.get_raw,
+        return self._make_cached_request(
             ENDPOINT_GET_REPORTING_PERIODS,
             "Failed to retrieve reporting periods",
             params={"clientId": client_id},
@@ -163,8 +192,7 @@ class EsgClient(HttpClient):
         )
 
     def get_template_structure(self) -> Dict[str, Any]:
-        return self._make_request(
-            self.get_raw,
+        return self._make_cached_request(
             ENDPOINT_GET_TEMPLATE_STRUCTURE,
             "Failed to retrieve template structure",
         )
@@ -173,13 +201,13 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        franchises_data: List[Dict[str, Any]],
+        franchises_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
-        rows = [
+        rows = (
             {"data": data, "index": i + 1} for i, data in enumerate(franchises_data)
-        ]
+        )
         template_data = {"franchisesTable": {"rows": rows}}
 
         return self._import_ui_data(
@@ -195,7 +223,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        intensity_metrics_data: List[Dict[str, Any]],
+        intensity_metrics_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
@@ -212,23 +240,23 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        equity_investments_data: List[Dict[str, Any]],
-        project_finance_data: List[Dict[str, Any]],
+        equity_investments_data: Iterable[Dict[str, Any]],
+        project_finance_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
         template_data = {
             "equityInvestmentsTable": {
-                "rows": [
+                "rows": (
                     {"data": data, "index": i + 1}
                     for i, data in enumerate(equity_investments_data)
-                ]
+                )
             },
             "projectFinanceTable": {
-                "rows": [
+                "rows": (
                     {"data": data, "index": i + 1}
                     for i, data in enumerate(project_finance_data)
-                ]
+                )
             },
         }
 
@@ -245,7 +273,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        water_storage_data: List[Dict[str, Any]],
+        water_storage_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
@@ -262,7 +290,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        employee_benefits_data: List[Dict[str, Any]],
+        employee_benefits_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
@@ -279,7 +307,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        social_protection_data: List[Dict[str, Any]],
+        social_protection_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
@@ -296,7 +324,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        non_compliance_data: List[Dict[str, Any]],
+        non_compliance_data: Iterable[Dict[str, Any]],
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
     ) -> Dict[str, Any]:
@@ -315,7 +343,7 @@ class EsgClient(HttpClient):
         self,
         entity_id: int,
         reporting_period_id: int,
-        locations_data: List[Dict[str, Any]],
+        locations_data: Iterable[Dict[str, Any]],
         ignore_locations: bool = False,
         data_not_available: bool = False,
         data_not_available_comment: Optional[str] = None,
@@ -337,19 +365,18 @@ class EsgClient(HttpClient):
         entity_id: int,
         reporting_period_id: int,
         template_id: int,
-        data: List[Dict[str, Any]],
+        data: Union[Iterable[Dict[str, Any]], GenericRows],
+        append: Optional[bool] = None,
     ) -> Dict[str, Any]:
-        rows = [
-            {
-                "columns": [
-                    {"name": key, "value": str(value)}
-                    for key, value in row_data.items()
-                ]
-            }
-            for row_data in data
-        ]
-
-        template_data = {"rows": rows}
+        """Import rows of a generic template.
+
+        The ImportGenericData endpoint replaces the rows stored for the entity, reporting period and template.
+        Batched uploads rely on its `append` flag: with `append=True` the API adds the rows to the stored ones
+        instead, with `append=False` it replaces them as without the flag. The flag is left out of the payload
+        when `append` is None, so a single request import sends the same payload as before the batching.
+        """
+        template_data = {"rows": GenericRows.from_dicts(data)}
+        extra_fields = {} if append is None else {"append": append}
 
         return self._import_ui_data(
             ENDPOINT_IMPORT_GENERIC_DATA,
@@ -357,4 +384,348 @@ class EsgClient(HttpClient):
             reporting_period_id,
             template_data,
             template_id=template_id,
+            **extra_fields,
+        )
+
+
+class CompressedBodies:
+    """Compression of the request bodies shared by the sync and async clients.
+
+    Call `init_compression` in the client constructor.
+    """
+
+    def init_compression(self, content_encoding: Optional[str]) -> None:
+        self.content_encoding = get_content_encoding(content_encoding)
+        self.encoding_accepted = False
+        self.bytes_serialized = 0
+        self.bytes_sent = 0
+
+    def _is_encoding_rejected(self, body: Any, response: Any) -> bool:
+        """Tell whether the server rejected the compression of the body, rather than its content."""
+        if not isinstance(body, SpooledBody) or not body.content_encoding:
+            return False
+        status_code = response.status_code
+        if status_code < 400:
+            self.encoding_accepted = True
+            return False
+        if self.encoding_accepted:
+            return False
+        if status_code != ENCODING_REJECTED_STATUS_CODE and not (
+            status_code == 400 and ENCODING_ERROR_PATTERN.search(response.text or "")
+        ):
+            return False
+
+        logging.warning(
+            f"ESG API rejected the {body.content_encoding} compressed request body with status code {status_code}, "
+            f"sending uncompressed request bodies from now on."
+        )
+        self.content_encoding = body.content_encoding = None
+        return True
+
+    def _record_body_size(self, body: SpooledBody) -> None:
+        self.bytes_serialized += body.size
+        self.bytes_sent += body.sent_size
+        if body.content_encoding:
+            logging.debug(
+                f"Sent {body.size} B request body as {body.sent_size} B {body.content_encoding} compressed data"
+            )
+
+    def log_transfer_summary(self) -> None:
+        """Log how many bytes the compression of the request bodies saved."""
+        if self.bytes_serialized and self.bytes_sent < self.bytes_serialized:
+            saved = 1 - self.bytes_sent / self.bytes_serialized
+            logging.info(
+                f"Sent {self.bytes_sent / 2**20:.1f} MiB of compressed request bodies instead of "
+                f"{self.bytes_serialized / 2**20:.1f} MiB of JSON, {saved:.0%} saved."
+            )
+
+
+class EsgClient(CompressedBodies, EsgEndpoints, HttpClient):
+    def __init__(
+        self,
+        component_id: str,
+        id_token: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        token_provider: Optional[TokenProvider] = None,
+        session: Optional[requests.Session] = None,
+        timeout: Union[float, tuple] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        content_encoding: Optional[str] = None,
+        metrics: Optional[PerformanceMetrics] = None,
+    ):
+        super().__init__(base_url=get_base_url(component_id), max_retries=3)
+        if id_token:
+            self.update_auth_header({"Authorization": f"Bearer {id_token}"})
+        self.cache = cache or ResponseCache(ttl=0)
+        self.token_provider = token_provider
+        self.session = session or create_session(max_retries=self.max_retries)
+        self.timeout = timeout
+        # imports of large tables may take longer than any read timeout, a timed out import could not be
+        # retried anyway, as it might have been processed
+        self.import_timeout = (timeout[0] if isinstance(timeout, tuple) else timeout, None)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or PerformanceMetrics()
+        self.init_compression(content_encoding)
+
+    def _request_raw(self, method: str, endpoint_path: Optional[str] = None, **kwargs) -> requests.Response:
+        """Send the request through the shared pooled session instead of a new session per request.
+
+        Headers are passed per request, so the session can be used from several threads at once.
+        """
+        url = self._build_url(endpoint_path, kwargs.pop("is_absolute_path", False))
+
+        headers = kwargs.pop("headers", None) or {}
+        headers.update(self._default_header)
+        if kwargs.pop("ignore_auth", False) is False:
+            headers.update(self._auth_header)
+            kwargs.setdefault("auth", self._auth)
+
+        if self._default_params:
+            kwargs["params"] = {**self._default_params, **(kwargs.pop("params", None) or {})}
+
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+    def _send(self, method: Callable, endpoint_path: str, **kwargs) -> requests.Response:
+        """Send the request within the rate limits, retrying throttled and failed requests with backoff.
+
+        A compressed body rejected by the server is sent again uncompressed, unless the server already
+        accepted a compressed body before, and all following bodies are sent uncompressed. Requests with
+        a body are not idempotent, they are sent again only when the server refused them, see `RetryPolicy`.
+        """
+        body = kwargs.get("data")
+        headers = kwargs.pop("headers", None) or {}
+        attempt = 0
+        while True:
+            if isinstance(body, SpooledBody):
+                kwargs["headers"] = {**headers, **body.headers}
+            elif headers:
+                kwargs["headers"] = headers
+
+            self.rate_limiter.acquire()
+            throttled = False
+            try:
+                with self.metrics.stage("http_send", endpoint_path) as counters:
+                    response = method(endpoint_path=endpoint_path, **kwargs)
+                    counters.update(response_counters(get_body_size(body), response))
+                throttled = response.status_code in THROTTLING_STATUS_CODES
+            finally:
+                self.rate_limiter.release(throttled)
+
+            if self._is_encoding_rejected(body, response):
+                continue
+
+            retry_after = response.headers.get("Retry-After")
+            if not self.retry_policy.should_retry(response.status_code, attempt, body is None, retry_after):
+                return response
+
+            delay = self.retry_policy.get_delay(attempt, retry_after)
+            logging.warning(
+                f"Request to {endpoint_path} failed with status code {response.status_code}, "
+                f"retrying in {delay:.1f} s"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+    def _make_request(
+        self, method: Callable, endpoint_path: str, error_message: str, **kwargs
+    ) -> Dict[str, Any]:
+        if self.token_provider:
+            # long runs outlive the id token, the provider refreshes it shortly before it expires
+            self.update_auth_header({"Authorization": f"Bearer {self.token_provider.get_id_token()}"})
+
+        try:
+            response = self._send(method, endpoint_path, **kwargs)
+            response.raise_for_status()
+
+            if response.status_code != 200:
+                raise UserException(
+                    f"Request to {endpoint_path} failed with status code {response.status_code},"
+                    f"{response.text}"
+                )
+
+            # Handle empty response
+            if not response.text:
+                return {
+                    "status": "success",
+                    "message": f"Request to {endpoint_path} completed successfully",
+                }
+
+            return serialization.loads(response.content)
+        except Exception as e:
+            try:
+                title = e.response.json().get("title")
+                message = ""
+                for k, v in e.response.json().get("errors").items():
+                    message += f"{k}: {v}\n"
+
+                raise UserException(f"{error_message}\n {title}\n {message}")
+            except Exception:
+                raise UserException(f"{error_message}: {e}")
+
+    def _make_cached_request(
+        self, endpoint_path: str, error_message: str, params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """GET request whose response is served from the cache while it is fresh."""
+        key = endpoint_path
+        if params:
+            key += "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.debug(f"Using cached response of {key}")
+            return cached
+
+        response = self._make_request(self.get_raw, endpoint_path, error_message, params=params)
+        self.cache.set(key, response)
+        return response
+
+    def _import_ui_data(
+        self,
+        endpoint: str,
+        entity_id: int,
+        reporting_period_id: int,
+        template_data: Any,
+        data_not_available: bool = False,
+        data_not_available_comment: Optional[str] = None,
+        **extra_fields,
+    ) -> Dict[str, Any]:
+        """Base method for importing UI data with common payload structure.
+
+        Args:
+            endpoint: The API endpoint to use
+            entity_id: The entity ID
+            reporting_period_id: The reporting period ID
+            template_data: The data to import
+            data_not_available: Whether data is not available
+            data_not_available_comment: Comment for unavailable data
+            **extra_fields: Additional fields to include in the payload
+
+        The payload is serialized lazily into a spooled body sent with chunked transfer encoding, so
+        `template_data` may contain generators instead of lists and is never materialized as a whole,
+        while the body can still be sent again when the request is retried. The body is compressed
+        when the client has a `content_encoding`. The response is awaited without a read timeout.
+
+        Returns:
+            Dict containing the response or success message
+        """
+        payload = build_ui_payload(
+            entity_id,
+            reporting_period_id,
+            template_data,
+            data_not_available,
+            data_not_available_comment,
+            **extra_fields,
         )
+
+        with self.metrics.stage("serialize"):
+            body = SpooledBody(iter_json(payload), content_encoding=self.content_encoding)
+        with body:
+            result = self._make_request(
+                self.post_raw,
+                endpoint,
+                f"Failed to import data to {endpoint}",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self.import_timeout,
+            )
+            self._record_body_size(body)
+            return result
+
+    def import_generic_data_in_batches(
+        self,
+        entity_id: int,
+        reporting_period_id: int,
+        template_id: int,
+        data: Iterable[Dict[str, Any]],
+        batch_size: int = BATCHE_SIZE,
+        max_concurrent_batches: int = 1,
+        progress: Optional[BatchProgress] = None,
+        append: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Import generic template data in batches of `batch_size` rows.
+
+        The first batch is sent alone and replaces the data stored for the entity, reporting period
+        and template, with `append=False` when more batches follow and without the flag when it is the only
+        one. All following batches are appended to it with `append=True`, up to `max_concurrent_batches` of them
+        in flight at once. When a batch fails, no further batches are sent, the batches in flight are awaited
+        and recorded in `progress` and the first error is raised. Rows are consumed lazily and held as compact
+        GenericRows, so at most `batch_size * (max_concurrent_batches + 1)` row tuples are held in memory.
+
+        Args:
+            entity_id: The entity ID
+            reporting_period_id: The reporting period ID
+            template_id: The generic template ID
+            data: Rows to import, any iterable of dicts
+            batch_size: Number of rows sent in one request
+            max_concurrent_batches: Number of append batches sent concurrently
+            progress: Progress of the upload, batches already imported by a previous run are skipped
+                and the upload continues by appending the remaining batches
+            append: Append all batches, including the first one, to the stored data
+
+        Returns:
+            List of responses, one per sent batch
+        """
+        if batch_size < 1:
+            raise UserException("Batch size must be a positive number.")
+
+        progress = progress or BatchProgress()
+        data = GenericRows.from_dicts(data)
+        batches = pending_batches(data.rows, batch_size, progress)
+        results = []
+        if not progress.acknowledged and not append:
+            # an empty table is still sent once, so the previously imported data gets replaced
+            first_batch, more_batches, batches = take_first_batch(batches)
+            results.append(
+                self.import_generic_data(
+                    entity_id,
+                    reporting_period_id,
+                    template_id,
+                    GenericRows(data.columns, first_batch),
+                    append=False if more_batches else None,
+                )
+            )
+            progress.done(0)
+
+        def send(batch: List[tuple]) -> Dict[str, Any]:
+            return self.import_generic_data(
+                entity_id, reporting_period_id, template_id, GenericRows(data.columns, batch), append=True
+            )
+
+        if max_concurrent_batches <= 1:
+            for index, batch in batches:
+                results.append(send(batch))
+                progress.done(index)
+            return results
+
+        executor = ThreadPoolExecutor(max_workers=max_concurrent_batches)
+        pending = {}
+        errors = []
+
+        def collect(done) -> None:
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+                else:
+                    progress.done(index)
+
+        try:
+            for index, batch in batches:
+                if len(pending) >= max_concurrent_batches:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                if errors:
+                    break
+                pending[executor.submit(send, batch)] = index
+        finally:
+            # batches in flight when an error occurs are still recorded, so a resumed upload does not append them again
+            collect(wait(pending).done)
+            executor.shutdown()
+
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import zipfile
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# rows not found in the previous index are held in memory until the diff is known,
+# with more changes than this the whole table is sent instead
+DIFF_MAX_CHANGED_ROWS = 100_000
+
+
+def row_digest(row: Dict[str, Any]) -> int:
+    """64-bit fingerprint of the row, independent of the column order."""
+    content = "\x1e".join(f"{key}\x1f{row[key]}" for key in sorted(row))
+    return int.from_bytes(hashlib.blake2b(content.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _contains(sorted_digests: array, digest: int) -> bool:
+    i = bisect_left(sorted_digests, digest)
+    return i < len(sorted_digests) and sorted_digests[i] == digest
+
+
+class RowDiff:
+    """Compares the rows of an upload with the fingerprints of the rows sent by the previous run.
+
+    The ESG API cannot update or delete single rows, the upload either replaces all stored rows or appends
+    to them with the `append` flag, see `EsgClient.import_generic_data`. Only an upload that keeps every
+    previously sent row can therefore be reduced to the inserted rows, any changed or deleted row makes
+    `complete` False and all rows have to be sent again, replacing the stored ones.
+
+    Attributes:
+        digests: Fingerprints of all compared rows, to be stored for the next run
+        inserted: Rows missing in the previous upload, None when there are too many of them
+        complete: True when no previously sent row is missing, so sending `inserted` is enough
+    """
+
+    def __init__(self, previous: array, rows: Iterable[Dict[str, Any]], max_changed_rows: int = DIFF_MAX_CHANGED_ROWS):
+        self.digests = array("Q")
+        self.inserted: Optional[List[Dict[str, Any]]] = []
+        inserted_digests = []
+        for row in rows:
+            digest = row_digest(row)
+            self.digests.append(digest)
+            if self.inserted is not None and not _contains(previous, digest):
+                self.inserted.append(row)
+                inserted_digests.append(digest)
+                if len(self.inserted) > max_changed_rows:
+                    self.inserted = None
+
+        # duplicated rows make the multiset comparison necessary, a row sent once before and twice now
+        # is inserted, although its fingerprint is already known
+        current = sorted(self.digests)
+        self.complete = self.inserted is not None and _is_sub_multiset(previous, current)
+        if self.complete and len(current) - len(previous) != len(inserted_digests):
+            self.complete = False
+
+
+def _is_sub_multiset(smaller: Iterable[int], larger: List[int]) -> bool:
+    i = 0
+    for digest in smaller:
+        while i < len(larger) and larger[i] < digest:
+            i += 1
+        if i == len(larger) or larger[i] != digest:
+            return False
+        i += 1
+    return True
+
+
+def record_digests(rows: Iterable[Dict[str, Any]], digests: array) -> Iterator[Dict[str, Any]]:
+    """Pass the rows through, appending their fingerprints to `digests`."""
+    for row in rows:
+        digests.append(row_digest(row))
+        yield row
+
+
+class FingerprintIndex:
+    """Row fingerprints of the last successful upload per template, entity and reporting period.
+
+    The fingerprints take 8 bytes per row and do not compress, so they are not kept in the state file
+    but saved to a file, an uncompressed ZIP archive with the sorted digests of each upload stored
+    as raw 8-byte integers. An entry recorded with different `settings` (e.g. value coercion) is ignored,
+    as the same rows were sent differently.
+    """
+
+    def __init__(self, settings: str = ""):
+        self.settings = settings
+        self._entries: Dict[str, Tuple[str, array]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, settings: str = "") -> "FingerprintIndex":
+        index = cls(settings)
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                digests = array("Q")
+                digests.frombytes(archive.read(info))
+                index._entries[info.filename] = (info.comment.decode("utf-8"), digests)
+        return index
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            entries = dict(self._entries)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for key, (settings, digests) in entries.items():
+                info = zipfile.ZipInfo(key)
+                info.comment = settings.encode("utf-8")
+                archive.writestr(info, digests.tobytes())
+
+    def get(self, key: str) -> Optional[array]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or entry[0] != self.settings:
+            return None
+        return entry[1]
+
+    def set(self, key: str, digests: Iterable[int]) -> None:
+        entry = (self.settings, array("Q", sorted(digests)))
+        with self._lock:
+            self._entries[key] = entry
@@ -0,0 +1,65 @@
+import sys
+from typing import Any, Dict, Iterable, Iterator, Sequence, Tuple, Union
+
+from common.src import serialization
+
+Row = Union[Tuple[Any, ...], Dict[str, Any]]
+
+
+class GenericRows:
+    """Rows of a generic template import in a compact form.
+
+    The column names are interned and kept once, each row is a tuple of its values in the column order.
+    Rows with other columns than the first row are kept as dicts. The rows are serialized straight to
+    the `{"columns": [{"name": ..., "value": ...}]}` structure expected by the API, without building
+    the per cell dicts, and iterating the instance yields the rows as dicts again.
+
+    `rows` may be a generator, then the instance can be serialized or iterated only once.
+    """
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns: Sequence[str], rows: Iterable[Row]):
+        self.columns = tuple(columns)
+        self.rows = rows
+
+    @classmethod
+    def from_dicts(cls, data: Iterable[Dict[str, Any]]) -> "GenericRows":
+        """Lazily convert the rows, the column names are taken from the first row."""
+        if isinstance(data, cls):
+            return data
+
+        iterator = iter(data)
+        first = next(iterator, None)
+        if first is None:
+            return cls((), [])
+        columns = tuple(sys.intern(str(key)) for key in first)
+
+        def rows() -> Iterator[Row]:
+            yield tuple(first.values())
+            for row in iterator:
+                yield tuple(row.values()) if tuple(row) == columns else row
+
+        return cls(columns, rows())
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in self.rows:
+            yield row if isinstance(row, dict) else dict(zip(self.columns, row))
+
+    def json_parts(self) -> Iterator[bytes]:
+        """The rows serialized as a JSON array, one part per row."""
+        dumps = serialization.dumps
+        prefixes = [b'{"name":' + dumps(column) + b',"value":' for column in self.columns]
+
+        yield b"["
+        for i, row in enumerate(self.rows):
+            if isinstance(row, dict):
+                cells = (b'{"name":' + dumps(str(key)) + b',"value":' + dumps(str(value)) + b"}"
+                         for key, value in row.items())
+            else:
+                cells = (prefix + dumps(str(value)) + b"}" for prefix, value in zip(prefixes, row))
+            yield (b',{"columns":[' if i else b'{"columns":[') + b",".join(cells) + b"]}"
+        yield b"]"
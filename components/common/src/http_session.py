@@ -0,0 +1,47 @@
+from typing import Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from keboola.http_client.http import METHOD_RETRY_WHITELIST
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+# a request of these methods may have been processed when the response failed to arrive, sending it again
+# could import the data twice
+NON_IDEMPOTENT_METHODS = {"POST", "PATCH"}
+IDEMPOTENT_METHODS = frozenset(METHOD_RETRY_WHITELIST) - NON_IDEMPOTENT_METHODS
+
+
+def create_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    keep_alive: bool = True,
+    max_retries: int = 3,
+    backoff_factor: float = 0.3,
+    status_forcelist: Tuple[int, ...] = (),
+) -> requests.Session:
+    """Create a session with a connection pool to be shared by the token call and all ESG API calls.
+
+    Reusing one session keeps TLS connections alive between requests, `pool_size` should be at least
+    the number of concurrent requests, otherwise the extra connections are closed after each use.
+    The session retries only connection errors of all requests and read errors of idempotent requests,
+    a POST is never sent again once it reached the server. Retries of throttled and failed responses
+    are left to the `RetryPolicy` of the client, which also adapts the request rate.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=max_retries,
+        read=max_retries,
+        connect=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=IDEMPOTENT_METHODS,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
@@ -0,0 +1,163 @@
+import csv
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+REPORT_COLUMNS = [
+    "stage",
+    "endpoint",
+    "calls",
+    "seconds",
+    "max_seconds",
+    "rows",
+    "bytes_sent",
+    "bytes_received",
+    "server_seconds",
+]
+
+_SERVER_TIMING_DURATION = re.compile(r"([\w-]+)[^,]*?;\s*dur=([\d.]+)")
+
+
+class _Frame:
+    """Time spent in the stages nested in the running stage, it is left out of the running stage."""
+
+    __slots__ = ("nested",)
+
+    def __init__(self):
+        self.nested = 0.0
+
+
+# the innermost running stage of the thread or asyncio task
+_current_frame: ContextVar[Optional[_Frame]] = ContextVar("current_frame", default=None)
+
+
+def get_server_time(response: Any) -> float:
+    """Seconds the server spent on the request.
+
+    Taken from the `total` metric of the Server-Timing header, or its longest metric, falling back to the
+    elapsed time of the response, which includes the network round trip.
+    """
+    durations = dict(_SERVER_TIMING_DURATION.findall(response.headers.get("Server-Timing", "")))
+    if durations:
+        return float(durations.get("total", max(durations.values(), key=float))) / 1000
+    return response.elapsed.total_seconds()
+
+
+def response_counters(body_size: int, response: Any) -> Dict[str, float]:
+    return {
+        "bytes_sent": body_size,
+        "bytes_received": len(response.content),
+        "server_seconds": get_server_time(response),
+    }
+
+
+def _accumulate(stats: Dict[str, Dict[str, float]], key: str, seconds: float, counters: Dict[str, float]) -> None:
+    entry = stats.setdefault(key, {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+    entry["calls"] += 1
+    entry["seconds"] += seconds
+    entry["max_seconds"] = max(entry["max_seconds"], seconds)
+    for name, value in counters.items():
+        entry[name] = entry.get(name, 0) + value
+
+
+def _rounded(stats: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        key: {name: round(value, 4) if isinstance(value, float) else value for name, value in entry.items()}
+        for key, entry in stats.items()
+    }
+
+
+class PerformanceMetrics:
+    """Durations and transferred bytes of the stages of a run, e.g. token refresh, CSV read, or HTTP send.
+
+    The stages of the lazy row pipeline run interleaved, a row is read, transformed, and serialized before
+    the next row is read. Each stage is therefore timed exclusively, the time of the stages nested in it is
+    left out, so the durations of the stages add up to the duration of the run. Requests are also summed up
+    per endpoint. The metrics can be shared by several threads and asyncio tasks.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.endpoints: Dict[str, Dict[str, float]] = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, endpoint: Optional[str] = None, **counters: float) -> None:
+        with self._lock:
+            _accumulate(self.stages, name, seconds, counters)
+            if endpoint:
+                _accumulate(self.endpoints, endpoint, seconds, counters)
+
+    @contextmanager
+    def stage(self, name: str, endpoint: Optional[str] = None) -> Iterator[Dict[str, float]]:
+        """Time the block as one call of the stage, counters set in the yielded dict are added to the stage."""
+        frame = _Frame()
+        parent = _current_frame.get()
+        token = _current_frame.set(frame)
+        counters = {}
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_frame.reset(token)
+            if parent is not None:
+                parent.nested += elapsed
+            self.add(name, elapsed - frame.nested, endpoint, **counters)
+
+    def timed(self, rows: Iterable[Any], name: str) -> Iterator[Any]:
+        """Pass the rows through, timing how long producing them takes as one call of the stage."""
+        iterator = iter(rows)
+        frame = _Frame()
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                parent = _current_frame.get()
+                token = _current_frame.set(frame)
+                start = time.perf_counter()
+                try:
+                    row = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.perf_counter() - start
+                    _current_frame.reset(token)
+                    seconds += elapsed
+                    if parent is not None:
+                        parent.nested += elapsed
+                count += 1
+                yield row
+        finally:
+            self.add(name, seconds - frame.nested, rows=count)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "stages": _rounded(self.stages),
+                "endpoints": _rounded(self.endpoints),
+            }
+
+    def log_summary(self) -> None:
+        logging.info(f"Performance summary: {json.dumps(self.summary())}")
+
+    def report_rows(self) -> List[Dict[str, Any]]:
+        """Rows of the performance report table, one per stage and one per requested endpoint."""
+        summary = self.summary()
+        rows = [{"stage": stage, "endpoint": "", **entry} for stage, entry in summary["stages"].items()]
+        rows += [
+            {"stage": "http_send", "endpoint": endpoint, **entry} for endpoint, entry in summary["endpoints"].items()
+        ]
+        return rows
+
+    def write_report(self, path: str) -> None:
+        with open(path, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=REPORT_COLUMNS, restval=0)
+            writer.writeheader()
+            writer.writerows(self.report_rows())
@@ -0,0 +1,140 @@
+import cProfile
+import collections
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+from keboola.component import CommonInterface
+
+PROFILE_FILE_TAGS = ["esg-profile"]
+TOP_ALLOCATIONS = 50
+# seconds between two samples of the thread stacks
+SAMPLE_INTERVAL = 0.005
+# frames kept by tracemalloc for each allocation
+TRACEMALLOC_FRAMES = 10
+# seconds between two checks of the traced memory, the allocations are snapshotted when it grows
+MEMORY_CHECK_INTERVAL = 0.5
+MEMORY_GROWTH_FACTOR = 1.1
+
+
+class StackSampler:
+    """Samples the stacks of all threads on a background thread, see `collapsed`."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts: Dict[str, int] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name}({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)).replace(" ", "_"))
+                self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Sampled stacks in the collapsed format of flamegraph.pl and speedscope, one `a;b;c count` per line."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+class RunProfiler:
+    """Profiles a run with cProfile, tracemalloc, and a stack sampler, writing the results to out/files.
+
+    cProfile sees only the calls of the thread the profiler was started on, which includes the asyncio
+    event loop, the stack sampler covers the worker threads too. The written files are:
+
+    - `profile.pstats`: cProfile stats, e.g. for `python -m pstats` or snakeviz
+    - `allocations.txt`: the top allocations by source line close to the peak of the traced memory
+    - `profile.collapsed`: sampled stacks of all threads for flamegraph.pl or speedscope
+
+    Tracing the allocations slows the run down considerably, so profile only runs being diagnosed.
+    """
+
+    def __init__(self, component: CommonInterface, top_allocations: int = TOP_ALLOCATIONS):
+        self.component = component
+        self.top_allocations = top_allocations
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler()
+        self.allocations: Optional[tracemalloc.Snapshot] = None
+        self.snapshot_memory = 0
+        self.peak_memory = 0
+        self._stopped = threading.Event()
+        self._memory_watcher = threading.Thread(target=self._watch_memory, name="memory-watcher", daemon=True)
+
+    def __enter__(self) -> "RunProfiler":
+        logging.info("Profiling the run, the results are written to the output files.")
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._memory_watcher.start()
+        self.sampler.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.disable()
+        self.sampler.stop()
+        self._stopped.set()
+        self._memory_watcher.join()
+        self._snapshot_if_grown()
+        _, self.peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.write_results()
+
+    def _watch_memory(self) -> None:
+        while not self._stopped.wait(MEMORY_CHECK_INTERVAL):
+            self._snapshot_if_grown()
+
+    def _snapshot_if_grown(self) -> None:
+        """Snapshot the allocations when the traced memory grew noticeably since the last snapshot.
+
+        Taking a snapshot is expensive, so the snapshot is only close to the actual peak.
+        """
+        current, _ = tracemalloc.get_traced_memory()
+        if self.allocations is None or current > self.snapshot_memory * MEMORY_GROWTH_FACTOR:
+            self.allocations = tracemalloc.take_snapshot()
+            self.snapshot_memory = current
+
+    def write_results(self) -> List[str]:
+        paths = []
+        for name, write in (
+            ("profile.pstats", self.profiler.dump_stats),
+            ("allocations.txt", self._write_allocations),
+            ("profile.collapsed", self._write_collapsed),
+        ):
+            file_def = self.component.create_out_file_definition(name, tags=PROFILE_FILE_TAGS)
+            write(file_def.full_path)
+            self.component.write_manifest(file_def)
+            paths.append(file_def.full_path)
+        logging.info(f"Profile written to {', '.join(os.path.basename(path) for path in paths)}")
+        return paths
+
+    def _write_allocations(self, path: str) -> None:
+        statistics = self.allocations.statistics("lineno")
+        with open(path, "w") as out:
+            out.write(f"Peak traced memory: {self.peak_memory / 2**20:.1f} MiB\n")
+            out.write(f"Traced memory at the snapshot: {self.snapshot_memory / 2**20:.1f} MiB\n\n")
+            out.write(f"Top {self.top_allocations} allocations by source line at the snapshot:\n")
+            for stat in statistics[: self.top_allocations]:
+                out.write(f"{stat}\n")
+
+    def _write_collapsed(self, path: str) -> None:
+        with open(path, "w") as out:
+            out.write(self.sampler.collapsed())
@@ -0,0 +1,164 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Optional
+
+THROTTLING_STATUS_CODES = (429, 503)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Limits the request rate to `rate` requests per second with bursts of up to `capacity` requests."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller has to wait until it is actually available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        time.sleep(self._reserve())
+
+    async def acquire_async(self) -> None:
+        await asyncio.sleep(self._reserve())
+
+
+class AimdConcurrencyLimiter:
+    """Concurrency limit adapted in the AIMD style of TCP congestion control.
+
+    Every successful request raises the limit by `1 / limit`, i.e. by one per round of requests, every
+    throttled request multiplies it by `decrease_factor`. The limit stays between `min_limit` and `max_limit`.
+
+    Threads wait for a free slot on a condition. Coroutines wait on a future of their event loop, which
+    `release` resolves thread-safely, so the limiter can be shared by threads and coroutines alike.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    def _has_free_slot(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.min_limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            self._condition.wait_for(self._has_free_slot)
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._has_free_slot():
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, throttled: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    # the waiting coroutine may have been cancelled meanwhile
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AdaptiveRateLimiter:
+    """Combines an optional request rate limit with the adaptive concurrency limit.
+
+    Call `acquire` before each request and `release` after it, telling whether the server throttled it.
+    The same limiter can be shared by threads and by coroutines of the asyncio client.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        max_concurrency: int = 10,
+        min_concurrency: int = 1,
+    ):
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.concurrency = AimdConcurrencyLimiter(max_concurrency, min_concurrency)
+
+    def acquire(self) -> None:
+        if self.bucket:
+            self.bucket.acquire()
+        self.concurrency.acquire()
+
+    async def acquire_async(self) -> None:
+        if self.bucket:
+            await self.bucket.acquire_async()
+        await self.concurrency.acquire_async()
+
+    def release(self, throttled: bool = False) -> None:
+        self.concurrency.release(throttled)
+
+
+class RetryPolicy:
+    """Retries throttled and failed requests with full-jitter exponential backoff.
+
+    The `Retry-After` header of the response takes precedence over the computed backoff. Requests that
+    are not idempotent, e.g. imports appending rows, may already be processed by the server when it answers
+    500, 502 or 504, a gateway timeout often means the server is still processing them. They are retried
+    only when the server refused them, with 429 or with 503 and `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 60.0,
+        retry_status_codes: Iterable[int] = RETRY_STATUS_CODES,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_status_codes = set(retry_status_codes)
+
+    def should_retry(
+        self, status_code: int, attempt: int, idempotent: bool = True, retry_after: Optional[str] = None
+    ) -> bool:
+        if status_code not in self.retry_status_codes or attempt >= self.max_retries:
+            return False
+        if idempotent:
+            return True
+        return status_code == 429 or (status_code == 503 and bool(retry_after))
+
+    def get_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.max_backoff, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    return min(self.max_backoff, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * 2**attempt))
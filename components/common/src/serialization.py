@@ -0,0 +1,68 @@
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class JsonSerializer:
+    """JSON backend serializing straight to UTF-8 bytes.
+
+    Both functions raise TypeError for values the backend can not serialize, e.g. generators.
+    """
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[Union[bytes, str]], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _create_serializers() -> Dict[str, JsonSerializer]:
+    serializers = {}
+    if orjson is not None:
+        serializers["orjson"] = JsonSerializer("orjson", orjson.dumps, orjson.loads)
+    if msgspec is not None:
+        encoder = msgspec.json.Encoder()
+        serializers["msgspec"] = JsonSerializer("msgspec", encoder.encode, msgspec.json.decode)
+    serializers["json"] = JsonSerializer("json", _stdlib_dumps, json.loads)
+    return serializers
+
+
+# available backends, the fastest first
+SERIALIZERS = _create_serializers()
+
+
+def get_serializer(name: Optional[str] = None) -> JsonSerializer:
+    """Serializer of the given backend, or of the fastest available one, falling back to the stdlib json."""
+    if name is None:
+        return next(iter(SERIALIZERS.values()))
+    return SERIALIZERS.get(name, SERIALIZERS["json"])
+
+
+serializer = get_serializer()
+
+
+def dumps(value: Any) -> bytes:
+    return serializer.dumps(value)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return serializer.loads(data)
+
+
+def use_serializer(name: Optional[str] = None) -> JsonSerializer:
+    """Switch the backend used by `dumps`, `loads` and the payload streaming."""
+    global serializer
+    serializer = get_serializer(name)
+    return serializer
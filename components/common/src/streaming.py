@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import zlib
+from collections.abc import AsyncIterator, Iterator, Mapping
+from tempfile import SpooledTemporaryFile
+from typing import Any, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from common.src import serialization
+
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 16 * 1024 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _iter_json_parts(value: Any) -> Iterator[bytes]:
+    if hasattr(value, "json_parts"):
+        # objects serializing themselves, e.g. the compact GenericRows
+        yield from value.json_parts()
+        return
+
+    if not isinstance(value, Iterator):
+        try:
+            # plain values and structures without iterators are serialized by the backend in one call
+            yield serialization.dumps(value)
+            return
+        except TypeError:
+            pass
+
+    if isinstance(value, Mapping):
+        yield b"{"
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                yield b","
+            yield serialization.dumps(str(key))
+            yield b":"
+            yield from _iter_json_parts(item)
+        yield b"}"
+    elif isinstance(value, (list, tuple, Iterator)):
+        yield b"["
+        for i, item in enumerate(value):
+            if i:
+                yield b","
+            yield from _iter_json_parts(item)
+        yield b"]"
+    else:
+        yield serialization.dumps(value)
+
+
+def iter_json(payload: Any, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterable[bytes]:
+    """Serialize the payload to UTF-8 encoded JSON chunks.
+
+    Generators and other iterators nested anywhere in the payload are serialized as JSON arrays
+    and consumed only while the chunks are being read, so the payload never has to exist in
+    memory as a whole. Everything else, e.g. each row of a generator, is serialized straight to bytes
+    by the fastest available JSON backend. Passed as a request body, the chunks are sent with chunked
+    transfer encoding.
+
+    Args:
+        payload: JSON serializable structure, possibly containing iterators instead of lists
+        chunk_size: Approximate size of the produced chunks in bytes
+
+    Yields:
+        Chunks of the serialized payload
+    """
+    buffer = []
+    buffered = 0
+    for part in _iter_json_parts(payload):
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def get_content_encoding(requested: Optional[str]) -> Optional[str]:
+    """Content encoding to use for request bodies, brotli falls back to gzip when it is not installed."""
+    if not requested or requested == "none":
+        return None
+    if requested == "br" and brotli is None:
+        logging.warning("Brotli compression requires the brotli package, using gzip instead.")
+        return "gzip"
+    return requested
+
+
+def compress(chunks: Iterable[bytes], content_encoding: str) -> Iterator[bytes]:
+    """Compress the chunks on the fly with gzip or brotli."""
+    if content_encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            if compressed := compressor.process(chunk):
+                yield compressed
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+class SpooledBody:
+    """Serialized request body kept in memory up to `max_memory` bytes and in a temporary file beyond that.
+
+    Iterating the body always starts from the beginning, so unlike a generator it can be sent again when
+    the request is retried. It is still sent with chunked transfer encoding. With `content_encoding`,
+    the body is compressed while it is being sent and `sent_size` tells the size after compression.
+    The asyncio client sends the body from `aiter_chunks`.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        max_memory: int = SPOOL_MAX_MEMORY,
+        content_encoding: Optional[str] = None,
+    ):
+        self._file = SpooledTemporaryFile(max_size=max_memory)
+        for chunk in chunks:
+            self._file.write(chunk)
+        self.size = self._file.tell()
+        self.content_encoding = content_encoding
+        self.sent_size = 0
+
+    @property
+    def headers(self) -> dict:
+        return {"Content-Encoding": self.content_encoding} if self.content_encoding else {}
+
+    def _read(self) -> Iterator[bytes]:
+        self._file.seek(0)
+        while chunk := self._file.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.sent_size = 0
+        chunks = compress(self._read(), self.content_encoding) if self.content_encoding else self._read()
+        for chunk in chunks:
+            self.sent_size += len(chunk)
+            yield chunk
+
+    async def aiter_chunks(self) -> AsyncIterator[bytes]:
+        """Iterate the body chunk by chunk without blocking the event loop.
+
+        Each chunk is read from the temporary file and compressed in a worker thread.
+        """
+        chunks = iter(self)
+        while (chunk := await asyncio.to_thread(next, chunks, None)) is not None:
+            yield chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "SpooledBody":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,99 @@
+import base64
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from keboola.component.exceptions import UserException
+
+TOKEN_URL = "https://login.microsoftonline.com/277a3012-4462-4bb3-90ee-986a2006ebeb/oauth2/v2.0/token"
+# the token is refreshed when it expires in less than this number of seconds
+TOKEN_EXPIRY_MARGIN = 300
+
+
+def _token_expiration(id_token: str, expires_in: Optional[int]) -> float:
+    try:
+        claims = id_token.split(".")[1]
+        claims += "=" * (-len(claims) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+    except Exception:
+        return time.time() + int(expires_in or 0)
+
+
+class TokenProvider:
+    """Provides the ESG API id token, refreshing it only when the cached one is about to expire.
+
+    The tokens are cached in the passed state dict, the `#` prefixed keys are encrypted by Keboola
+    when the state file is stored. `refreshed` tells whether the state changed and should be saved.
+    """
+
+    def __init__(
+        self,
+        state: Dict[str, Any],
+        auth_id: str,
+        app_key: str,
+        app_secret: str,
+        refresh_token: str,
+        session: Optional[requests.Session] = None,
+        token_url: Optional[str] = None,
+    ):
+        self.state = state
+        self.auth_id = auth_id
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.refresh_token = refresh_token
+        self.session = session or requests.Session()
+        self.token_url = token_url or TOKEN_URL
+        self.refreshed = False
+        self._lock = threading.Lock()
+
+    def _is_state_valid(self) -> bool:
+        return bool(self.state.get("#refresh_token")) and self.state.get("auth_id") == self.auth_id
+
+    def get_id_token(self) -> str:
+        with self._lock:
+            if (
+                self._is_state_valid()
+                and self.state.get("#id_token")
+                and self.state.get("id_token_expires_at", 0) - TOKEN_EXPIRY_MARGIN > time.time()
+            ):
+                logging.debug("Using cached id token from state file")
+                return self.state["#id_token"]
+
+            return self._refresh()
+
+    def _refresh(self) -> str:
+        if self._is_state_valid():
+            logging.debug("Using refresh token from state file")
+            refresh_token = self.state["#refresh_token"]
+        else:
+            logging.debug("Using refresh token from configuration")
+            refresh_token = self.refresh_token
+
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        payload = {
+            "client_id": self.app_key,
+            "client_secret": self.app_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }
+
+        response = self.session.post(self.token_url, headers=headers, data=payload)
+        if response.status_code != 200:
+            raise UserException(
+                f"Unable to refresh access token. Status code: {response.status_code} "
+                f"Reason: {response.reason}, message: {response.json()}"
+            )
+        data = response.json()
+        self.state.update(
+            {
+                "#refresh_token": data["refresh_token"],
+                "auth_id": self.auth_id,
+                "#id_token": data["id_token"],
+                "id_token_expires_at": _token_expiration(data["id_token"], data.get("expires_in")),
+            }
+        )
+        self.refreshed = True
+        return data["id_token"]
@@ -0,0 +1,182 @@
+import logging
+import math
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from common.src.coercion import NUMBER_COLUMN_TYPES, INTEGER_COLUMN_TYPES
+
+# formats tried after ISO 8601
+DATE_FORMATS = ("%d.%m.%Y", "%m/%d/%Y")
+
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _is_truthy(value: Any) -> bool:
+    return str(value).strip().lower() == "true"
+
+
+def _whole(value: float) -> Optional[str]:
+    return None if value.is_integer() else "must be a whole number"
+
+
+def _positive(value: float) -> Optional[str]:
+    return None if value > 0 else "must be positive"
+
+
+def _not_negative(value: float) -> Optional[str]:
+    return None if value >= 0 else "must not be negative"
+
+
+def _negative(value: float) -> Optional[str]:
+    return None if value < 0 else "must be negative"
+
+
+def _not_positive(value: float) -> Optional[str]:
+    return None if value <= 0 else "must not be positive"
+
+
+def _percentage(value: float) -> Optional[str]:
+    return None if 0 <= value <= 100 else "must be between 0 and 100"
+
+
+# checks of the `numberCondition` values, matched without spaces and case
+NUMBER_CONDITIONS: Dict[str, Tuple[Callable[[float], Optional[str]], ...]] = {
+    "positive": (_positive,),
+    "positiveorzero": (_not_negative,),
+    "nonnegative": (_not_negative,),
+    "negative": (_negative,),
+    "negativeorzero": (_not_positive,),
+    "integer": (_whole,),
+    "positiveinteger": (_whole, _positive),
+    "percentage": (_percentage,),
+}
+
+
+class TemplateValidator:
+    """Validates rows of generic template data locally against the template structure.
+
+    Checks `isRequired`, `mustBeInPeriod`, lookup membership and `numberCondition` of the template columns,
+    matched by `dbColumnName` or `excelColumnName`. Columns unknown to the template are not checked, nor are
+    number conditions without a local check. Dates are checked against the period bounds only when they
+    are known. Dates in a format the validator cannot parse are only reported as warnings, the API decides
+    whether they are valid.
+    """
+
+    def __init__(
+        self,
+        template: Dict[str, Any],
+        lookups: Optional[Dict[str, Set[str]]] = None,
+        period_start: Optional[date] = None,
+        period_end: Optional[date] = None,
+    ):
+        self.lookups = lookups or {}
+        self.period_start = period_start
+        self.period_end = period_end
+        self.columns = {}
+        self.number_checks = {}
+        for column in template.get("columnsConfiguration", []):
+            if _is_truthy(column.get("disableValidation")):
+                continue
+            number_checks = self._get_number_checks(column)
+            for name in (column.get("dbColumnName"), column.get("excelColumnName")):
+                if name:
+                    self.columns[name] = column
+                    self.number_checks[name] = number_checks
+
+    @property
+    def checks_period(self) -> bool:
+        """Whether any column must be in the reporting period."""
+        return any(_is_truthy(column.get("mustBeInPeriod")) for column in self.columns.values())
+
+    @staticmethod
+    def _get_number_checks(column: Dict[str, Any]) -> Tuple[Callable[[float], Optional[str]], ...]:
+        column_type = str(column.get("columnType") or "").replace(" ", "").lower()
+        checks = (_whole,) if column_type in INTEGER_COLUMN_TYPES else ()
+        condition = str(column.get("numberCondition") or "").replace(" ", "").lower()
+        if not condition:
+            return checks
+        if condition not in NUMBER_CONDITIONS:
+            name = column.get("dbColumnName") or column.get("excelColumnName")
+            logging.warning(f"Number condition '{column['numberCondition']}' of column {name} is not checked locally.")
+            return checks
+        return checks + NUMBER_CONDITIONS[condition]
+
+    @staticmethod
+    def get_lookup_names(template: Dict[str, Any]) -> Set[str]:
+        return {
+            column["lookupName"]
+            for column in template.get("columnsConfiguration", [])
+            if column.get("columnType") == "Lookup" and column.get("lookupName")
+        }
+
+    def _validate_value(self, name: str, column: Dict[str, Any], value: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return the error and the warning of the value."""
+        column_type = str(column.get("columnType") or "").replace(" ", "").lower()
+
+        if column_type == "lookup" and column.get("lookupName") in self.lookups:
+            if value not in self.lookups[column["lookupName"]]:
+                return f"value '{value}' is not in lookup {column['lookupName']}", None
+
+        if column_type in NUMBER_COLUMN_TYPES or column_type in INTEGER_COLUMN_TYPES:
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                return f"value '{value}' is not a number", None
+            for check in self.number_checks[name]:
+                if error := check(number):
+                    return f"value '{value}' {error}", None
+
+        if _is_truthy(column.get("mustBeInPeriod")):
+            parsed = _parse_date(value)
+            if parsed is None:
+                return None, f"value '{value}' is not a date in a known format, it was not checked"
+            if (self.period_start and parsed < self.period_start) or (self.period_end and parsed > self.period_end):
+                return f"date {value} is outside of the reporting period", None
+
+        return None, None
+
+    def check(self, row: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Return the errors and the warnings of the row, the row is valid when it has no errors."""
+        errors, warnings = [], []
+        for name, column in self.columns.items():
+            value = row.get(name)
+            if value is None:
+                continue
+            value = str(value).strip()
+            if not value:
+                if _is_truthy(column.get("isRequired")):
+                    errors.append(f"{name}: value is required")
+                continue
+            error, warning = self._validate_value(name, column, value)
+            if error:
+                errors.append(f"{name}: {error}")
+            if warning:
+                warnings.append(f"{name}: {warning}")
+        return errors, warnings
+
+    def validate(self, row: Dict[str, Any]) -> List[str]:
+        """Return the list of errors of the row, empty for a valid row."""
+        return self.check(row)[0]
+
+    def find_invalid_rows(self, rows: Iterable[Dict[str, Any]]) -> Iterable[tuple]:
+        """Yield `(row_number, row, errors, warnings)` for each row with errors or warnings.
+
+        Rows are numbered from 1, rows with only warnings are valid.
+        """
+        for row_number, row in enumerate(rows, start=1):
+            errors, warnings = self.check(row)
+            if errors or warnings:
+                yield row_number, row, errors, warnings
@@ -0,0 +1,353 @@
+"""Local stand-in for the ESG API to test and benchmark the components offline.
+
+The server implements the `ExternalIntegration/*` endpoints used by the ESG clients plus the OAuth token
+endpoint, with configurable latency, throttling, error injection, and payload size limits. Tests point
+the clients to it by setting their `base_url` to `api_url` and passing `token_url` to the TokenProvider.
+It can also run standalone, e.g.
+
+    python -m common.tests.mock_server --port 8000 --latency 0.05 --max-concurrency 8 --error-rate 0.01
+"""
+
+import argparse
+import base64
+import collections
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+API_PREFIX = "/api/"
+TOKEN_PATH = "/token"
+TOKEN_EXPIRES_IN = 3600
+
+
+def _fake_id_token(expires_in: int) -> str:
+    """Unsigned JWT, the clients only read the expiration from it."""
+
+    def encode(part: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+
+    return ".".join([encode({"alg": "none"}), encode({"exp": int(time.time()) + expires_in}), ""])
+
+
+def _build_templates(lookups: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "templateId": template_id,
+            "templateName": f"Template {template_id}",
+            "columnsConfiguration": [
+                {"columnType": "Text", "dbColumnName": "Name", "excelColumnName": "Name", "isRequired": True},
+                {
+                    "columnType": "Number",
+                    "dbColumnName": "Value",
+                    "excelColumnName": "Value",
+                    "numberCondition": "PositiveOrZero",
+                },
+                {"columnType": "Lookup", "dbColumnName": "Category", "lookupName": lookups[template_id % len(lookups)]},
+            ],
+        }
+        for template_id in range(1, 11)
+    ]
+
+
+class MockEsgServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering like the ESG API, see the module docstring.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on, 0 picks a free one
+        latency: Seconds every response is delayed by
+        latency_jitter: Up to this many seconds are added to the latency at random
+        max_concurrency: Requests over this number of requests in progress are throttled with 429
+        max_requests_per_second: Requests over this rate are throttled with 429
+        throttle_rate: Share of the requests throttled with 429 at random
+        error_rate: Share of the requests failing with 500 at random
+        max_payload_bytes: Larger request bodies, after decompression, are rejected with 413
+        retry_after: Value of the Retry-After header of throttled responses
+        keep_payloads: Keep the decoded bodies of the import requests in `payloads`
+        seed: Seed of the random throttling, errors, and jitter
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        max_concurrency: Optional[int] = None,
+        max_requests_per_second: Optional[float] = None,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        max_payload_bytes: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        keep_payloads: bool = False,
+        seed: Optional[int] = None,
+    ):
+        super().__init__((host, port), MockEsgHandler)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.max_concurrency = max_concurrency
+        self.max_requests_per_second = max_requests_per_second
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.max_payload_bytes = max_payload_bytes
+        self.retry_after = retry_after
+        self.keep_payloads = keep_payloads
+        self.random = random.Random(seed)
+
+        self.lookups = ["Country", "Currency", "Unit", "TypeOfIntensityMetric"]
+        self.templates = _build_templates(self.lookups)
+        self.clients = [{"id": client_id, "name": f"Client {client_id}"} for client_id in range(1, 4)]
+        self.entities = {str(entity_id): f"Entity {entity_id}" for entity_id in range(1, 6)}
+        self.reporting_periods = {str(period_id): f"FY{2019 + period_id}" for period_id in range(1, 5)}
+
+        self._lock = threading.Lock()
+        self._recent_requests = collections.deque()
+        self._thread = None
+        self.reset()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def api_url(self) -> str:
+        return self.url + API_PREFIX
+
+    @property
+    def token_url(self) -> str:
+        return self.url + TOKEN_PATH
+
+    def reset(self) -> None:
+        """Reset the statistics of the received requests."""
+        with self._lock:
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.status_codes = collections.Counter()
+            self.payloads = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "max_in_flight": self.max_in_flight,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "status_codes": dict(self.status_codes),
+            }
+
+    def start(self) -> "MockEsgServer":
+        """Serve the requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread = None
+
+    def __enter__(self) -> "MockEsgServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def enter_request(self) -> Optional[int]:
+        """Count the request in, return the status to throttle or fail it with, if any."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            if self.max_requests_per_second:
+                while self._recent_requests and self._recent_requests[0] <= now - 1:
+                    self._recent_requests.popleft()
+                if len(self._recent_requests) >= self.max_requests_per_second:
+                    return 429
+                self._recent_requests.append(now)
+
+            if self.max_concurrency and self.in_flight > self.max_concurrency:
+                return 429
+            if self.random.random() < self.throttle_rate:
+                return 429
+            if self.random.random() < self.error_rate:
+                return 500
+        return None
+
+    def exit_request(self, status: int, body_size: int, payload_size: int) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.status_codes[status] += 1
+            self.bytes_sent += body_size
+            self.bytes_received += payload_size
+
+    def response_delay(self) -> float:
+        with self._lock:
+            return self.latency + self.random.uniform(0, self.latency_jitter)
+
+    def get(self, path: str, query: Dict[str, List[str]]) -> Any:
+        """Response of the GET endpoint, None for unknown ones."""
+        if path == "ExternalIntegration/ClientData/GetClientIds":
+            return self.clients
+        if path == "ExternalIntegration/ClientData/GetEntitiesWithReportingPeriods":
+            return {"entities": self.entities, "reportingPeriods": self.reporting_periods}
+        if path == "ExternalIntegration/ClientData/GetEntities":
+            return self.entities
+        if path == "ExternalIntegration/ClientData/GetReportingPeriods":
+            return self.reporting_periods
+        if path == "ExternalIntegration/LookupData/GetLookupData":
+            name = query.get("lookupName", [""])[0]
+            return [f"{name} {value}" for value in range(1, 21)]
+        if path == "ExternalIntegration/TemplateData/TemplatesStructure":
+            return self.templates
+        return None
+
+
+class MockEsgHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockEsgServer
+
+    def log_message(self, format, *args):
+        logging.debug("Mock ESG API: " + format, *args)
+
+    def _read_body(self) -> bytes:
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            body = bytearray()
+            while size := int(self.rfile.readline().split(b";")[0], 16):
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            # trailer section ends with an empty line
+            while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            return bytes(body)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _decode_body(self, body: bytes) -> Optional[bytes]:
+        """Decompressed body, None when its encoding is not supported."""
+        encoding = self.headers.get("Content-Encoding", "identity")
+        if encoding == "identity":
+            return body
+        if encoding == "gzip":
+            return gzip.decompress(body)
+        if encoding == "br" and brotli is not None:
+            return brotli.decompress(body)
+        return None
+
+    def _respond(self, status: int, content: Any = None, started: Optional[float] = None) -> None:
+        body = b"" if content is None else json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if started is not None:
+            self.send_header("Server-Timing", f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+        if status == 429 and self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, title: str) -> tuple:
+        return status, {"title": title, "errors": {"request": [title]}}
+
+    def _handle(self, method: str) -> None:
+        body = self._read_body() if method == "POST" else b""
+        started = time.perf_counter()
+        status = self.server.enter_request()
+        payload = b""
+        try:
+            if status is not None:
+                status, content = self._error(status, "Too Many Requests" if status == 429 else "Internal Error")
+            else:
+                status, content, payload = self._route(method, body)
+            time.sleep(self.server.response_delay())
+            self._respond(status, content, started)
+        finally:
+            self.server.exit_request(status, len(body), len(payload))
+
+    def _route(self, method: str, body: bytes) -> tuple:
+        url = urlsplit(self.path)
+        if method == "POST" and url.path == TOKEN_PATH:
+            content = {
+                "id_token": _fake_id_token(TOKEN_EXPIRES_IN),
+                "refresh_token": "mock-refresh-token",
+                "expires_in": TOKEN_EXPIRES_IN,
+            }
+            return 200, content, b""
+
+        if not url.path.startswith(API_PREFIX):
+            return (*self._error(404, f"Unknown path {url.path}"), b"")
+        path = url.path[len(API_PREFIX):]
+
+        if method == "GET":
+            content = self.server.get(path, parse_qs(url.query))
+            if content is None:
+                return (*self._error(404, f"Unknown endpoint {path}"), b"")
+            return 200, content, b""
+
+        if not path.startswith("ExternalIntegration/TemplateData/Import"):
+            return (*self._error(404, f"Unknown endpoint {path}"), b"")
+        payload = self._decode_body(body)
+        if payload is None:
+            return (*self._error(415, "Unsupported content encoding"), b"")
+        if self.server.max_payload_bytes and len(payload) > self.server.max_payload_bytes:
+            return (*self._error(413, "Payload too large"), payload)
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return (*self._error(400, "Invalid JSON body"), payload)
+        if self.server.keep_payloads:
+            with self.server._lock:
+                self.server.payloads.append((path, data))
+        return 200, None, payload
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the ESG API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every response is delayed by")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="random extra delay in seconds")
+    parser.add_argument("--max-concurrency", type=int, help="requests in progress over this limit get 429")
+    parser.add_argument("--max-requests-per-second", type=float, help="requests over this rate get 429")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--max-payload-bytes", type=int, help="larger request bodies get 413")
+    parser.add_argument("--retry-after", type=float, help="Retry-After header of throttled responses")
+    parser.add_argument("--seed", type=int)
+    options = vars(parser.parse_args(args))
+
+    logging.basicConfig(level=logging.INFO)
+    with MockEsgServer(**options) as server:
+        logging.info(f"Mock ESG API listening, API URL {server.api_url}, token URL {server.token_url}")
+        try:
+            while True:
+                time.sleep(60)
+                logging.info(f"Mock ESG API stats: {server.stats()}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,15 @@ Template Component main class.
 
 """
 
+import asyncio
 import csv
+import hashlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cached_property
 from io import StringIO
-
-import requests
+from typing import TYPE_CHECKING
 
 from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
@@ -15,67 +19,145 @@ from keboola.component.sync_actions import SelectElement
 from wurlitzer import pipes
 
 # from components.common.src.esg_client import EsgClient
+from common.src.cache import ResponseCache
 from common.src.esg_client import EsgClient
+from common.src.http_session import DEFAULT_CONNECT_TIMEOUT, create_session
+from common.src.metrics import PerformanceMetrics
+from common.src.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from common.src.token_provider import TokenProvider
 from configuration import Configuration
 
+if TYPE_CHECKING:
+    from common.src.async_esg_client import AsyncEsgClient
+
+# columns and incremental primary keys of the client tables
+CLIENT_TABLES = {
+    "clients": (["client_id", "client_name"], ["client_id"]),
+    "entities": (["client_id", "entity_id", "entity_name"], ["client_id", "entity_id"]),
+    "reporting_periods": (
+        ["client_id", "reporting_period_id", "reporting_period_name"],
+        ["client_id", "reporting_period_id"],
+    ),
+}
+TEMPLATE_ENDPOINTS = {"templates_structure", "lookup_tables"}
+
 
 class Component(ComponentBase):
     def __init__(self):
         super().__init__()
         self.params = Configuration(**self.configuration.parameters)
         self.client = None
+        self.token_provider = None
+        self.state = self.get_state_file()
+        self.output_hashes = {}
+
+    @cached_property
+    def session(self):
+        return create_session(pool_size=self.params.pool_size, keep_alive=self.params.keep_alive)
+
+    @cached_property
+    def rate_limiter(self) -> AdaptiveRateLimiter:
+        # shared by all clients of the run, so throttling seen by one of them slows down all of them
+        return AdaptiveRateLimiter(
+            requests_per_second=self.params.max_requests_per_second or None, max_concurrency=self.params.pool_size
+        )
 
-    def run(self):
-        self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
-
-        templates = self.client.get_template_structure()
+    @cached_property
+    def retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(max_retries=self.params.max_retries)
 
-        if "lookup_tables" in self.params.endpoints:
-            self.export_lookup_tables(templates)
+    @cached_property
+    def cache(self) -> ResponseCache:
+        cache = ResponseCache(self.state.get("api_cache"), ttl=self.params.cache_ttl)
+        if self.params.clear_cache:
+            cache.invalidate()
+        return cache
 
-        if "templates_structure" in self.params.endpoints:
-            self.export_templates_structure(templates)
+    @cached_property
+    def metrics(self) -> PerformanceMetrics:
+        return PerformanceMetrics()
 
-    def refresh_tokens(self) -> str:
-        statefile = self.get_state_file()
-        if (
-            statefile.get("#refresh_token")
-            and statefile.get("auth_id") == self.configuration.oauth_credentials.id
-        ):
-            logging.debug("Using refresh token from state file")
-            refresh_token = statefile.get("#refresh_token")
-        else:
-            logging.debug("Using refresh token from configuration")
-            refresh_token = self.configuration.oauth_credentials.data.get(
-                "refresh_token"
-            )
+    def run(self):
+        # the exported tables must reflect the current API data, the cached responses serve only the sync actions,
+        # the responses fetched by the run are cached again for them
+        self.cache.invalidate()
+        try:
+            self.client = self.create_client()
+
+            if TEMPLATE_ENDPOINTS.intersection(self.params.endpoints):
+                templates = self.client.get_template_structure()
+
+                if "lookup_tables" in self.params.endpoints:
+                    self.export_lookup_tables(templates)
+
+                if "templates_structure" in self.params.endpoints:
+                    with self.metrics.stage("write_output"):
+                        self.export_templates_structure(templates)
+
+            if "clients" in self.params.endpoints:
+                self.export_clients()
+        finally:
+            self.report_performance()
+
+        self.state["output_hashes"] = self.output_hashes
+        self.save_state()
+
+    def report_performance(self) -> None:
+        """Log the durations and transferred bytes of the run stages, optionally also as an output table."""
+        self.metrics.log_summary()
+        if self.params.performance_report:
+            out_table = self.create_out_table_definition("performance_report.csv")
+            self.metrics.write_report(out_table.full_path)
+            self.write_manifest(out_table)
 
-        client_id = self.configuration.oauth_credentials.appKey
-        client_secret = self.configuration.oauth_credentials.appSecret
+    def is_output_unchanged(self, table_name: str, content) -> bool:
+        """Record the content hash of the output table and check it against the previous run.
 
-        url = "https://login.microsoftonline.com/277a3012-4462-4bb3-90ee-986a2006ebeb/oauth2/v2.0/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-        }
+        Returns:
+            True if unchanged outputs are skipped and the content matches the hash stored in state
+        """
+        content_hash = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self.output_hashes[table_name] = content_hash
+        unchanged = self.state.get("output_hashes", {}).get(table_name) == content_hash
+        if unchanged and self.params.skip_unchanged:
+            logging.info(f"Skipping unchanged output table {table_name}")
+            return True
+        return False
 
-        response = requests.post(url, headers=headers, data=payload)
-        if response.status_code != 200:
-            raise UserException(
-                f"Unable to refresh access token. Status code: {response.status_code} "
-                f"Reason: {response.reason}, message: {response.json()}"
+    def refresh_tokens(self) -> str:
+        if self.token_provider is None:
+            credentials = self.configuration.oauth_credentials
+            self.token_provider = TokenProvider(
+                self.state,
+                auth_id=credentials.id,
+                app_key=credentials.appKey,
+                app_secret=credentials.appSecret,
+                refresh_token=credentials.data.get("refresh_token"),
+                session=self.session,
             )
-        data = response.json()
-        self.write_state_file(
-            {
-                "#refresh_token": data["refresh_token"],
-                "auth_id": self.configuration.oauth_credentials.id,
-            }
+
+        with self.metrics.stage("token_refresh"):
+            id_token = self.token_provider.get_id_token()
+        if self.token_provider.refreshed:
+            self.save_state()
+        return id_token
+
+    def create_client(self) -> EsgClient:
+        return EsgClient(
+            self.environment_variables.component_id,
+            self.refresh_tokens(),
+            self.cache,
+            self.token_provider,
+            session=self.session,
+            timeout=(DEFAULT_CONNECT_TIMEOUT, self.params.timeout),
+            rate_limiter=self.rate_limiter,
+            retry_policy=self.retry_policy,
+            metrics=self.metrics,
         )
-        return data["id_token"]
+
+    def save_state(self) -> None:
+        self.state["api_cache"] = self.cache.to_dict()
+        self.write_state_file(self.state)
 
     def export_lookup_tables(self, templates) -> None:
         lookups = self.get_lookup_tables_names(templates)
@@ -89,17 +171,113 @@ class Component(ComponentBase):
             ]
         )
 
-        for lookup in lookups:
-            data = self.client.get_lookup_data(lookup)
-            out_table = self.create_out_table_definition(
-                name=f"lookup_table-{lookup.replace(' ', '_')}"
-            )
-            with open(out_table.full_path, "w", newline="") as out:
-                writer = csv.writer(out)
-                writer.writerow(["value"])
-                for row in data:
-                    writer.writerow([row])
-            self.write_manifest(out_table)
+        logging.info(f"Exporting {len(lookups)} lookup tables using {self.params.max_workers} workers...")
+        if self.params.async_mode:
+            asyncio.run(self.export_lookup_tables_async(lookups))
+            return
+
+        with ThreadPoolExecutor(max_workers=self.params.max_workers) as executor:
+            futures = {executor.submit(self.client.get_lookup_data, lookup): lookup for lookup in lookups}
+            for future in as_completed(futures):
+                lookup, data = futures[future], future.result()
+                with self.metrics.stage("write_output"):
+                    self.write_lookup_table(lookup, data)
+
+    def create_async_client(self) -> "AsyncEsgClient":
+        # imported only by the asyncio runs, so the sync actions do not pay for it
+        from common.src.async_esg_client import AsyncEsgClient
+
+        return AsyncEsgClient(
+            self.environment_variables.component_id,
+            cache=self.cache,
+            token_provider=self.token_provider,
+            timeout=self.params.timeout,
+            max_concurrency=self.params.max_workers,
+            rate_limiter=self.rate_limiter,
+            retry_policy=self.retry_policy,
+            metrics=self.metrics,
+        )
+
+    async def export_lookup_tables_async(self, lookups: set[str]) -> None:
+        """Fetch the lookups concurrently on a single thread, each table is written as soon as it arrives."""
+        async with self.create_async_client() as client:
+
+            async def fetch(lookup: str) -> tuple[str, list]:
+                return lookup, await client.get_lookup_data(lookup)
+
+            for next_done in asyncio.as_completed([fetch(lookup) for lookup in lookups]):
+                lookup, data = await next_done
+                with self.metrics.stage("write_output"):
+                    self.write_lookup_table(lookup, data)
+
+    def write_lookup_table(self, lookup: str, data: list) -> None:
+        table_name = f"lookup_table-{lookup.replace(' ', '_')}"
+        if self.is_output_unchanged(table_name, data):
+            return
+
+        out_table = self.create_out_table_definition(name=table_name)
+        with open(out_table.full_path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(["value"])
+            for row in data:
+                writer.writerow([row])
+        self.write_manifest(out_table)
+
+    def export_clients(self) -> None:
+        """Export all clients with their entities and reporting periods to the normalized client tables.
+
+        The entities and reporting periods of the clients are fetched concurrently. The tables are loaded
+        incrementally, so clients removed from the API are kept in Storage.
+        """
+        clients = self.client.get_clients()
+        client_ids = [client["id"] for client in clients]
+
+        logging.info(
+            f"Exporting entities and reporting periods of {len(clients)} clients "
+            f"using {self.params.max_workers} workers..."
+        )
+        if self.params.async_mode:
+            client_data = asyncio.run(self.get_entities_with_periods_async(client_ids))
+        else:
+            with ThreadPoolExecutor(max_workers=self.params.max_workers) as executor:
+                client_data = list(executor.map(self.client.get_entities_with_periods, client_ids))
+
+        rows = {
+            "clients": [[client["id"], client["name"]] for client in clients],
+            "entities": [
+                [client_id, entity_id, entity_name]
+                for client_id, data in zip(client_ids, client_data)
+                for entity_id, entity_name in data["entities"].items()
+            ],
+            "reporting_periods": [
+                [client_id, period_id, period_name]
+                for client_id, data in zip(client_ids, client_data)
+                for period_id, period_name in data["reportingPeriods"].items()
+            ],
+        }
+        with self.metrics.stage("write_output"):
+            for name, table_rows in rows.items():
+                self.write_client_table(name, table_rows)
+
+    async def get_entities_with_periods_async(self, client_ids: list) -> list[dict]:
+        """Fetch the entities and reporting periods of the clients concurrently on a single thread."""
+        async with self.create_async_client() as client:
+            return await asyncio.gather(*(client.get_entities_with_periods(client_id) for client_id in client_ids))
+
+    def write_client_table(self, name: str, rows: list) -> None:
+        table_name = f"{name}.csv"
+        if self.is_output_unchanged(table_name, rows):
+            return
+
+        columns, primary_key = CLIENT_TABLES[name]
+        out_table = self.create_out_table_definition(
+            name=table_name, schema=columns, primary_key=primary_key, incremental=True, has_header=True
+        )
+        with open(out_table.full_path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            writer.writerows(rows)
+        self.write_manifest(out_table)
 
     def get_lookup_tables_names(self, templates) -> set[str]:
         lookups = []
@@ -134,6 +312,9 @@ class Component(ComponentBase):
                              .replace(" ", "").replace(",", "").replace("(", "-").replace(")", ""))
 
             file_name = f"template_{template_id}-{template_name}.csv"
+            if self.is_output_unchanged(file_name, template.get("columnsConfiguration", [])):
+                continue
+
             out_table = self.create_out_table_definition(
                 name=file_name,
                 schema=[
@@ -182,8 +363,9 @@ class Component(ComponentBase):
     def list_clients(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             clients = self.client.get_clients()
+            self.save_state()
             return [
                 SelectElement(value=f"{client['id']}-{client['name']}")
                 for client in clients
@@ -193,8 +375,9 @@ class Component(ComponentBase):
     def list_entities_with_periods(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             data = self.client.get_entities_with_periods(self.params.client_id)
+            self.save_state()
 
             return [
                 SelectElement(value=f"{pid}-{pname}   {eid}-{ename}")
@@ -206,8 +389,9 @@ class Component(ComponentBase):
     def list_entities(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             entities = self.client.get_entities(self.params.client_id)
+            self.save_state()
             return [
                 SelectElement(value=f"{value}-{label}")
                 for value, label in entities.items()
@@ -217,8 +401,9 @@ class Component(ComponentBase):
     def list_reporting_periods(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             entities = self.client.get_reporting_periods(self.params.client_id)
+            self.save_state()
             return [
                 SelectElement(value=f"{value}-{label}")
                 for value, label in entities.items()
@@ -228,8 +413,9 @@ class Component(ComponentBase):
     def list_templates(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             templates = self.client.get_template_structure()
+            self.save_state()
             return [
                 SelectElement(value=f"{val['templateId']}-{val['templateName']}")
                 for val in templates
@@ -243,7 +429,14 @@ if __name__ == "__main__":
     try:
         comp = Component()
         # this triggers the run method by default and is controlled by the configuration.action parameter
-        comp.execute_action()
+        if comp.params.profile:
+            # imported only when profiling, so the sync actions do not pay for it
+            from common.src.profiling import RunProfiler
+
+            with RunProfiler(comp):
+                comp.execute_action()
+        else:
+            comp.execute_action()
     except UserException as exc:
         logging.exception(exc)
         exit(1)
@@ -11,6 +11,18 @@ class Configuration(BaseModel):
     reporting_period_id: int = 0
     entity_id: int = 0
     endpoints: list[str] = ["templates_structure", "lookup_tables"]
+    max_workers: int = 8
+    async_mode: bool = False
+    skip_unchanged: bool = False
+    cache_ttl: int = 3600
+    clear_cache: bool = False
+    pool_size: int = 10
+    keep_alive: bool = True
+    timeout: int = 300
+    max_requests_per_second: float = 0
+    max_retries: int = 5
+    performance_report: bool = False
+    profile: bool = False
     debug: bool = False
 
     @field_validator("client_id")
@@ -4,15 +4,51 @@ Created on 12. 11. 2018
 @author: esner
 """
 
+import csv
+import json
 import os
+import tempfile
 import unittest
 
 import mock
 import os
 from freezegun import freeze_time
 
+from keboola.component.exceptions import UserException
+
+from common.src.async_esg_client import AsyncEsgClient
+from common.src.esg_client import EsgClient
+from common.tests.mock_server import MockEsgServer
 from component import Component
 
+COMPONENT_ID = "keboola.ex-esg-management-solution"
+TEMPLATES = [
+    {
+        "templateId": 1,
+        "templateName": "Emissions",
+        "columnsConfiguration": [
+            {"columnType": "Lookup", "lookupName": "Country"},
+            {"columnType": "Lookup", "lookupName": "Unit"},
+            {"columnType": "Number", "dbColumnName": "value"},
+        ],
+    }
+]
+LOOKUP_TABLES = {
+    f"lookup_table-{name}"
+    for name in (
+        "Country",
+        "Unit",
+        "NonCompliance-CategoryOfSanction",
+        "ProjectFinanceAndDebtInvestment_InvestmentType",
+        "EquityInvestment_InvestmentType",
+        "TypeOfIntensityMetric",
+    )
+}
+
+
+def lookup_values(lookup_name: str) -> list:
+    return [f"{lookup_name} {value}" for value in range(1, 6)]
+
 
 class TestComponent(unittest.TestCase):
     # set global time to 2010-10-10 - affects functions like datetime.now()
@@ -25,6 +61,240 @@ class TestComponent(unittest.TestCase):
             comp.run()
 
 
+class ComponentTestCase(unittest.TestCase):
+    """Runs the component in a temporary data directory."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        self.tables_dir = os.path.join(self.data_dir, "out", "tables")
+        os.makedirs(os.path.join(self.data_dir, "in"))
+        os.makedirs(self.tables_dir)
+        self.environ = mock.patch.dict(os.environ, {"KBC_DATADIR": self.data_dir, "KBC_COMPONENTID": COMPONENT_ID})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.tmp.cleanup()
+
+    def create_component(self, state: dict = None, **parameters) -> Component:
+        with open(os.path.join(self.data_dir, "config.json"), "w") as f:
+            json.dump({"parameters": {"max_workers": 3, **parameters}}, f)
+        with open(os.path.join(self.data_dir, "in", "state.json"), "w") as f:
+            json.dump(state or {}, f)
+        return Component()
+
+    def clear_output(self) -> None:
+        for name in os.listdir(self.tables_dir):
+            os.remove(os.path.join(self.tables_dir, name))
+
+    def read_table(self, name: str) -> list:
+        with open(os.path.join(self.tables_dir, name), newline="") as f:
+            return list(csv.reader(f))
+
+
+class TestExportLookupTables(ComponentTestCase):
+    def export_lookup_tables(self, get_lookup_data: mock.Mock, **parameters) -> Component:
+        comp = self.create_component(**parameters)
+        comp.client = mock.Mock(get_lookup_data=get_lookup_data)
+
+        async def async_get_lookup_data(client: AsyncEsgClient, lookup_name: str) -> list:
+            return get_lookup_data(lookup_name)
+
+        with mock.patch.object(AsyncEsgClient, "get_lookup_data", async_get_lookup_data):
+            comp.export_lookup_tables(TEMPLATES)
+        return comp
+
+    def test_all_lookup_tables_written(self):
+        for async_mode in (False, True):
+            with self.subTest(async_mode=async_mode):
+                self.clear_output()
+                get_lookup_data = mock.Mock(side_effect=lookup_values)
+
+                self.export_lookup_tables(get_lookup_data, async_mode=async_mode)
+
+                self.assertEqual(get_lookup_data.call_count, len(LOOKUP_TABLES))
+                self.assertEqual({name for name in os.listdir(self.tables_dir) if "." not in name}, LOOKUP_TABLES)
+                # the rows keep the order of the lookup values
+                self.assertEqual(
+                    self.read_table("lookup_table-Country"), [["value"], *([v] for v in lookup_values("Country"))]
+                )
+
+    def test_failed_lookup_fails_export(self):
+        def get_lookup_data(lookup_name: str) -> list:
+            if lookup_name == "Unit":
+                raise UserException("Failed to retrieve lookup data: 500 Server Error")
+            return lookup_values(lookup_name)
+
+        for async_mode in (False, True):
+            with self.subTest(async_mode=async_mode):
+                with self.assertRaisesRegex(UserException, "Failed to retrieve lookup data"):
+                    self.export_lookup_tables(mock.Mock(side_effect=get_lookup_data), async_mode=async_mode)
+
+                self.assertNotIn("lookup_table-Unit", os.listdir(self.tables_dir))
+
+
+class TestSkipUnchangedOutputs(ComponentTestCase):
+    def run_component(self, state: dict = None, **parameters) -> dict:
+        """Run the component and return the state it saved."""
+        comp = self.create_component(state, endpoints=["templates_structure", "lookup_tables"], **parameters)
+        client = mock.Mock(get_lookup_data=mock.Mock(side_effect=lookup_values))
+        client.get_template_structure.return_value = TEMPLATES
+        with mock.patch.object(Component, "create_client", return_value=client):
+            comp.run()
+        with open(os.path.join(self.data_dir, "out", "state.json")) as f:
+            return json.load(f)
+
+    def written_tables(self) -> set:
+        return {name for name in os.listdir(self.tables_dir) if not name.endswith(".manifest")}
+
+    def test_hashes_of_written_tables_saved_in_state(self):
+        state = self.run_component(skip_unchanged=True)
+
+        self.assertEqual(self.written_tables(), {*LOOKUP_TABLES, "template_1-Emissions.csv"})
+        self.assertEqual(set(state["output_hashes"]), self.written_tables())
+        self.assertTrue(all(len(content_hash) == 64 for content_hash in state["output_hashes"].values()))
+
+    def test_unchanged_tables_skipped(self):
+        previous_state = self.run_component()
+        self.clear_output()
+
+        state = self.run_component(previous_state, skip_unchanged=True)
+
+        self.assertEqual(self.written_tables(), set())
+        # the hashes of the skipped tables are kept, so they are skipped by the next run too
+        self.assertEqual(state["output_hashes"], previous_state["output_hashes"])
+
+    def test_changed_table_written(self):
+        previous_state = self.run_component()
+        self.clear_output()
+        changed_state = {"output_hashes": {**previous_state["output_hashes"], "lookup_table-Country": "0" * 64}}
+
+        state = self.run_component(changed_state, skip_unchanged=True)
+
+        self.assertEqual(self.written_tables(), {"lookup_table-Country"})
+        self.assertEqual(state["output_hashes"], previous_state["output_hashes"])
+
+    def test_table_missing_in_state_written(self):
+        previous_state = self.run_component()
+        self.clear_output()
+        del previous_state["output_hashes"]["template_1-Emissions.csv"]
+
+        state = self.run_component(previous_state, skip_unchanged=True)
+
+        self.assertEqual(self.written_tables(), {"template_1-Emissions.csv"})
+        self.assertIn("template_1-Emissions.csv", state["output_hashes"])
+
+    def test_unchanged_tables_written_when_not_skipped(self):
+        previous_state = self.run_component()
+        self.clear_output()
+
+        self.run_component(previous_state, skip_unchanged=False)
+
+        self.assertEqual(self.written_tables(), {*LOOKUP_TABLES, "template_1-Emissions.csv"})
+
+
+class TestExportClients(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        os.makedirs(os.path.join(self.data_dir, "in"))
+        os.makedirs(os.path.join(self.data_dir, "out", "tables"))
+        self.server = MockEsgServer().start()
+        self.environ = mock.patch.dict(os.environ, {"KBC_DATADIR": self.data_dir, "KBC_COMPONENTID": COMPONENT_ID})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def export_clients(self, **parameters) -> Component:
+        with open(os.path.join(self.data_dir, "config.json"), "w") as f:
+            json.dump({"parameters": {"endpoints": ["clients"], "max_workers": 2, **parameters}}, f)
+        comp = Component()
+        create_async_client = comp.create_async_client
+
+        def create_client():
+            client = EsgClient(COMPONENT_ID, "token", comp.cache, session=comp.session)
+            client.base_url = self.server.api_url
+            return client
+
+        def create_mock_async_client():
+            client = create_async_client()
+            client.base_url = self.server.api_url
+            return client
+
+        comp.create_client = create_client
+        comp.create_async_client = create_mock_async_client
+        comp.run()
+        return comp
+
+    def keep_state(self) -> None:
+        """Pass the state written by the last run to the next one."""
+        os.replace(os.path.join(self.data_dir, "out", "state.json"), os.path.join(self.data_dir, "in", "state.json"))
+
+    def read_table(self, name: str) -> tuple[list, dict]:
+        path = os.path.join(self.data_dir, "out", "tables", name)
+        with open(path, newline="") as f, open(f"{path}.manifest") as manifest:
+            return list(csv.reader(f)), json.load(manifest)
+
+    def assert_client_tables(self):
+        clients, manifest = self.read_table("clients.csv")
+        self.assertEqual(
+            clients, [["client_id", "client_name"], ["1", "Client 1"], ["2", "Client 2"], ["3", "Client 3"]]
+        )
+        self.assertTrue(manifest["incremental"])
+        self.assertTrue(manifest["has_header"])
+        self.assertEqual([column["name"] for column in manifest["schema"] if column.get("primary_key")], ["client_id"])
+
+        entities, manifest = self.read_table("entities.csv")
+        self.assertEqual(len(entities), 1 + 3 * 5)
+        self.assertEqual(entities[:2], [["client_id", "entity_id", "entity_name"], ["1", "1", "Entity 1"]])
+        self.assertEqual(
+            [column["name"] for column in manifest["schema"] if column.get("primary_key")], ["client_id", "entity_id"]
+        )
+
+        periods, _ = self.read_table("reporting_periods.csv")
+        self.assertEqual(len(periods), 1 + 3 * 4)
+        self.assertEqual(periods[-1], ["3", "4", "FY2023"])
+
+    def test_client_tables_written(self):
+        self.export_clients()
+
+        self.assert_client_tables()
+        # the clients and the entities with periods of each of them
+        self.assertEqual(self.server.stats()["requests"], 1 + 3)
+
+    def test_client_tables_written_in_async_mode(self):
+        self.export_clients(async_mode=True)
+
+        self.assert_client_tables()
+
+    def test_unchanged_client_tables_skipped(self):
+        self.export_clients()
+        self.keep_state()
+        tables_dir = os.path.join(self.data_dir, "out", "tables")
+        for name in os.listdir(tables_dir):
+            os.remove(os.path.join(tables_dir, name))
+
+        self.export_clients(skip_unchanged=True)
+
+        self.assertEqual(os.listdir(tables_dir), [])
+
+    def test_cached_responses_not_exported(self):
+        self.export_clients()
+        self.keep_state()
+        self.server.clients.append({"id": 4, "name": "Client 4"})
+
+        self.export_clients()
+
+        clients, _ = self.read_table("clients.csv")
+        self.assertEqual(clients[-1], ["4", "Client 4"])
+        # both runs requested the clients and the entities with periods of each of them
+        self.assertEqual(self.server.stats()["requests"], (1 + 3) + (1 + 4))
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# sync actions fill the dropdowns in the UI, the component has to start quickly
+IMPORT_TIME_BUDGET = 1.0
+# modules needed only by some runs, they must be imported on first use
+LAZY_MODULES = {
+    "cProfile", "tracemalloc", "pyarrow", "http.server", "common.src.profiling", "common.src.async_esg_client"
+}
+# runs a sync action in a fresh interpreter, prints the imported modules
+SYNC_ACTION_SCRIPT = """
+import json, os, sys, tempfile
+from unittest import mock
+
+from component import Component, EsgClient
+
+with tempfile.TemporaryDirectory() as data_dir:
+    os.makedirs(os.path.join(data_dir, "out"))
+    with open(os.path.join(data_dir, "config.json"), "w") as f:
+        json.dump({"action": "list_reporting_periods", "parameters": {"client_id": "1-Client"}}, f)
+    os.environ.update(KBC_DATADIR=data_dir, KBC_COMPONENTID="keboola.ex-esg-management-solution")
+    with (
+        mock.patch.object(Component, "refresh_tokens", return_value="token"),
+        mock.patch.object(EsgClient, "get_reporting_periods", return_value={}),
+    ):
+        Component().execute_action()
+print()
+print(json.dumps({"modules": sorted(sys.modules)}))
+"""
+
+
+def import_component() -> dict:
+    """Import the component in a fresh interpreter, return the cumulative import time of each module in seconds."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import component"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def run_sync_action() -> dict:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-c", SYNC_ACTION_SCRIPT], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+class TestImportTime(unittest.TestCase):
+    def test_component_imports_within_budget(self):
+        times = import_component()
+
+        self.assertLess(times["component"], IMPORT_TIME_BUDGET)
+        self.assertFalse(LAZY_MODULES & times.keys(), "modules imported at start up")
+
+    def test_sync_action_skips_run_only_imports(self):
+        result = run_sync_action()
+
+        self.assertFalse(LAZY_MODULES & set(result["modules"]), "modules imported by a sync action")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from common.src.esg_client import EsgClient  # noqa: E402
+from common.tests.mock_server import MockEsgServer  # noqa: E402
+
+# 1M rows take minutes per endpoint and gigabytes of memory, run them only on demand
+ROW_COUNTS = [1_000, 100_000] + ([1_000_000] if os.environ.get("ESG_BENCHMARK_LARGE") else [])
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    """Mock ESG API, configured from the ESG_MOCK_LATENCY and ESG_MOCK_THROTTLE_RATE environment variables."""
+    with MockEsgServer(
+        latency=float(os.environ.get("ESG_MOCK_LATENCY", 0)),
+        throttle_rate=float(os.environ.get("ESG_MOCK_THROTTLE_RATE", 0)),
+        seed=0,
+    ) as server:
+        yield server
+
+
+@pytest.fixture
+def component_factory(mock_server, monkeypatch):
+    """Create the writer component for the endpoint, with a client sending the requests to the mock server."""
+    from component import Component
+
+    data_dir = tempfile.TemporaryDirectory()
+
+    def create(endpoint: str, **parameters) -> Component:
+        with open(os.path.join(data_dir.name, "config.json"), "w") as f:
+            json.dump({"parameters": {"endpoint": endpoint, **parameters}, "action": "run"}, f)
+        monkeypatch.setenv("KBC_DATADIR", data_dir.name)
+
+        component = Component()
+        component.client = EsgClient("keboola.wr-esg-management-solution", "token", session=component.session)
+        component.client.base_url = mock_server.api_url
+        return component
+
+    yield create
+    data_dir.cleanup()
@@ -0,0 +1,123 @@
+"""Synthetic input rows for every writer endpoint, generated deterministically from the row number."""
+
+from typing import Callable, Dict, Iterator, List
+
+CONTRACT_TYPES = ("permanent", "temporary", "non-guaranteed")
+BENEFIT_TYPES = (
+    "disabilityCoverage",
+    "healthCare",
+    "lifeInsurance",
+    "other",
+    "parentalLeave",
+    "retirementProvision",
+    "stockOwnership",
+)
+
+
+def franchises(i: int) -> dict:
+    return {
+        "name": f"Franchise {i}",
+        "country": f"Country {i % 50}",
+        "revenue": str(i * 10.5),
+        "employees": str(i % 500),
+    }
+
+
+def intensity_metrics(i: int) -> dict:
+    return {
+        "name": f"Metric {i}",
+        "emission": "true" if i % 2 else "false",
+        "water": "false",
+        "energy": "true",
+        "totalValueReported": str(i * 1.25),
+        "reportedValueInHighClimateSectors": "" if i % 7 else str(i),
+    }
+
+
+def equity_investments(i: int) -> dict:
+    return {"investee": f"Company {i}", "share_of_equity": str(i % 100 / 100), "investment_type": "Equity"}
+
+
+def project_finance(i: int) -> dict:
+    return {"project": f"Project {i}", "share_of_total_project_cost": str(i % 100 / 100), "investment_type": "Debt"}
+
+
+def water_storage(i: int) -> dict:
+    return {"facility": f"Facility {i}", "storage_start": str(i * 3), "storage_end": str(i * 3 + 1), "unit": "ML"}
+
+
+def employee_benefits(i: int) -> dict:
+    return {
+        "location": f"Location {i // 700}",
+        "significant_location": f"Site {i // 7 % 100}",
+        "benefit_type": BENEFIT_TYPES[i % len(BENEFIT_TYPES)],
+        "full_time_permanent": str(i % 2),
+        "part_time_permanent": "1",
+        "full_time_temporary": "0",
+        "part_time_temporary": str(i % 3),
+    }
+
+
+def social_protection(i: int) -> dict:
+    counts = ("sickness", "employment_injury_disability", "parental_leave", "unemployment", "retirement")
+    return {
+        "location": f"Location {i // 1500}",
+        "recorded": "True",
+        "country_name": f"Country {i // 3 % 500}",
+        "contract_type": CONTRACT_TYPES[i % len(CONTRACT_TYPES)],
+        **{f"{count}_{group}": str(i % 1000) for count in counts for group in ("employees", "other_worker")},
+    }
+
+
+def locations(i: int) -> dict:
+    return {
+        "location": f"Location {i}",
+        "environmental_template_ids": "1;2;3",
+        "governance_template_ids": "4;5",
+        "social_template_ids": "6;7;8;9",
+    }
+
+
+def non_compliance(i: int) -> dict:
+    return {"CategoryOfSanction": "Fine", "NumberOfIncidents": str(i % 5), "MonetaryValue": str(i * 100.5)}
+
+
+def generic(i: int) -> dict:
+    return {
+        "name": f"Row {i}",
+        "category": f"Category {i % 20}",
+        "value": str(i * 1.5),
+        "unit": "tCO2e",
+        "date": f"2024-{i % 12 + 1:02d}-01",
+        "comment": "",
+    }
+
+
+def rows(factory: Callable[[int], dict], count: int) -> List[dict]:
+    return [factory(i) for i in range(count)]
+
+
+# import method and the generators of its data arguments per endpoint
+ENDPOINTS: Dict[str, tuple] = {
+    "franchises": ("import_franchises_ui_data", {"data": franchises}),
+    "intensity_metrics": ("import_intensity_metrics_ui_data", {"data": intensity_metrics}),
+    "investments": (
+        "import_investments_ui_data",
+        {"investments_data": equity_investments, "finance_data": project_finance},
+    ),
+    "water_storage": ("import_water_storage_ui_data", {"data": water_storage}),
+    "employee_benefits": ("import_employee_benefits_ui_data", {"data": employee_benefits}),
+    "social_protection": ("import_social_protection_ui_data", {"data": social_protection}),
+    "locations": ("import_locations_ui_data", {"data": locations}),
+    "non_compliance": ("import_non_compliance_ui_data", {"data": non_compliance}),
+    "generic": ("import_generic_data", {"data": generic}),
+}
+
+
+def make_inputs(endpoint: str, count: int) -> Dict[str, List[dict]]:
+    _, arguments = ENDPOINTS[endpoint]
+    return {argument: rows(factory, count) for argument, factory in arguments.items()}
+
+
+def iter_rows(factory: Callable[[int], dict], count: int) -> Iterator[dict]:
+    return (factory(i) for i in range(count))
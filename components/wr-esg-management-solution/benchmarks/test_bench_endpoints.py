@@ -0,0 +1,73 @@
+"""Benchmarks of the writer endpoints against a local mock ESG API.
+
+Run from the component directory with pytest-benchmark installed:
+
+    PYTHONPATH=src:.. python -m pytest benchmarks
+
+Set ESG_BENCHMARK_LARGE=1 to include the 1M row inputs. Besides the timings, every benchmark records
+the peak memory of the import and the size of the sent payload in `extra_info`, see `--benchmark-json`.
+"""
+
+import tracemalloc
+
+import pytest
+from conftest import ROW_COUNTS
+from synthetic_data import ENDPOINTS, generic, iter_rows, make_inputs
+
+from common.src.generic_rows import GenericRows
+from common.src.streaming import iter_json
+
+
+def record_memory_and_size(benchmark, mock_server, run, inputs) -> None:
+    """Run the import once more outside of the timed rounds to measure its peak memory and payload size."""
+    mock_server.reset()
+    tracemalloc.start()
+    try:
+        run(**inputs())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_memory_mb"] = round(peak / 2**20, 2)
+    benchmark.extra_info["payload_bytes"] = mock_server.bytes_received
+    benchmark.extra_info["sent_bytes"] = mock_server.bytes_sent
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+@pytest.mark.parametrize("endpoint", list(ENDPOINTS))
+def test_import(benchmark, component_factory, mock_server, endpoint, row_count):
+    component = component_factory(endpoint)
+    method_name, _ = ENDPOINTS[endpoint]
+
+    def run(**inputs):
+        getattr(component, method_name)(entity_id=1, reporting_period_id=2, **inputs)
+
+    def inputs():
+        return make_inputs(endpoint, row_count)
+
+    benchmark.pedantic(run, setup=lambda: ((), inputs()), rounds=3 if row_count <= 100_000 else 1)
+    record_memory_and_size(benchmark, mock_server, run, inputs)
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_generic_batches(benchmark, component_factory, mock_server, row_count, compression):
+    component = component_factory("generic", batch_size=10_000, concurrent_batches=4, compression=compression)
+    component.client.init_compression(compression)
+
+    def run(data):
+        component.import_generic_data(entity_id=1, reporting_period_id=2, data=data)
+
+    def inputs():
+        return {"data": iter_rows(generic, row_count)}
+
+    benchmark.pedantic(run, setup=lambda: ((), inputs()), rounds=3 if row_count <= 100_000 else 1)
+    record_memory_and_size(benchmark, mock_server, run, inputs)
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+def test_generic_serialization(benchmark, row_count):
+    def serialize(data):
+        return sum(len(chunk) for chunk in iter_json({"templateData": {"rows": GenericRows.from_dicts(data)}}))
+
+    size = benchmark.pedantic(serialize, setup=lambda: ((iter_rows(generic, row_count),), {}), rounds=3)
+    benchmark.extra_info["payload_bytes"] = size
@@ -0,0 +1,14 @@
+#!/bin/sh
+# Runs the 1k and 100k row benchmarks and fails when the fastest round of any of them is more than 25 % slower
+# than in the saved baseline. The timings depend on the machine, so the baseline is saved locally with `--save`
+# before the change and is not committed.
+set -e
+
+pip install -q -r requirements-benchmark.txt
+export PYTHONPATH="src:..:${PYTHONPATH}"
+
+if [ "$1" = "--save" ]; then
+    python -m pytest benchmarks --benchmark-save=baseline
+else
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=min:25%
+fi
@@ -3,10 +3,15 @@ Template Component main class.
 
 """
 
+import asyncio
 import csv
+import inspect
 import logging
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cached_property, partial
 from io import StringIO
-import requests
+from typing import Callable, Iterable, Iterator, Optional, Set
 
 from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
@@ -14,8 +19,134 @@ from keboola.component.sync_actions import SelectElement
 from wurlitzer import pipes
 
 # from components.common.src.esg_client import EsgClient
+from common.src.cache import ResponseCache
+from common.src.checkpoint import UploadCheckpoints, file_fingerprint
+from common.src.coercion import CoercionPlan, to_bool, to_float_or_zero
 from common.src.esg_client import EsgClient
+from common.src.fingerprint import FingerprintIndex, RowDiff, record_digests
+from common.src.http_session import DEFAULT_CONNECT_TIMEOUT, create_session
+from common.src.metrics import PerformanceMetrics
+from common.src.rate_limit import AdaptiveRateLimiter, RetryPolicy
+from common.src.token_provider import TokenProvider
+from common.src.validation import TemplateValidator
 from configuration import Configuration
+from grouping import Level, group_rows
+from table_reader import read_csv_rows
+
+ENTITY_ID_COLUMN = "entity_id"
+REPORTING_PERIOD_ID_COLUMN = "reporting_period_id"
+# the row fingerprints of the diff mode are kept in a Storage file read back by the file input mapping,
+# its name and tag are suffixed with the configuration and row ID, so each row reads only its own file
+FINGERPRINTS_FILE_TAG = "esg-row-fingerprints"
+
+INTENSITY_METRICS_PLAN = CoercionPlan(
+    {
+        "emission": to_bool,
+        "water": to_bool,
+        "energy": to_bool,
+        "totalValueReported": to_float_or_zero,
+        "reportedValueInHighClimateSectors": to_float_or_zero,
+    }
+)
+NON_COMPLIANCE_PLAN = CoercionPlan({"NumberOfIncidents": int, "MonetaryValue": float})
+
+BENEFIT_TYPES = (
+    "disabilityCoverage",
+    "healthCare",
+    "lifeInsurance",
+    "other",
+    "parentalLeave",
+    "retirementProvision",
+    "stockOwnership",
+)
+# shared by all benefit types without a row, it is only serialized, never modified
+EMPTY_BENEFIT_DATA = {
+    "fullTimeEmployeesWithPermanentContract": 0,
+    "partTimeEmployeesWithPermanentContract": 0,
+    "fullTimeEmployeesWithTemporaryContract": 0,
+    "partTimeEmployeesWithTemporaryContract": 0,
+}
+
+
+def add_benefit(significant_location: dict, row: dict) -> None:
+    if row["benefit_type"] in BENEFIT_TYPES:
+        significant_location[row["benefit_type"]] = {
+            "fullTimeEmployeesWithPermanentContract": row["full_time_permanent"],
+            "partTimeEmployeesWithPermanentContract": row["part_time_permanent"],
+            "fullTimeEmployeesWithTemporaryContract": row["full_time_temporary"],
+            "partTimeEmployeesWithTemporaryContract": row["part_time_temporary"],
+        }
+
+
+def create_contract(contract_type: str, row: dict) -> dict:
+    return {
+        "name": contract_type,
+        "sickness": {
+            "employees": int(row["sickness_employees"]),
+            "other_worker": int(row["sickness_other_worker"]),
+        },
+        "employmentInjuryAndDisability": {
+            "employees": int(row["employment_injury_disability_employees"]),
+            "other_worker": int(row["employment_injury_disability_other_worker"]),
+        },
+        "parentalLeave": {
+            "employees": int(row["parental_leave_employees"]),
+            "other_worker": int(row["parental_leave_other_worker"]),
+        },
+        "unemploymentStartingFrom": {
+            "employees": int(row["unemployment_employees"]),
+            "other_worker": int(row["unemployment_other_worker"]),
+        },
+        "retirement": {
+            "employees": int(row["retirement_employees"]),
+            "other_worker": int(row["retirement_other_worker"]),
+        },
+    }  # fmt: skip
+
+
+EMPLOYEE_BENEFITS_LEVELS = [
+    Level(
+        "location",
+        lambda location, row: {"location": location, "significantLocations": []},
+        children="significantLocations",
+    ),
+    Level(
+        "significant_location",
+        lambda significant_location, row: {
+            "significantLocation": significant_location,
+            **dict.fromkeys(BENEFIT_TYPES, EMPTY_BENEFIT_DATA),
+        },
+        add=add_benefit,
+    ),
+]
+# the first row of each contract type is used
+SOCIAL_PROTECTION_LEVELS = [
+    Level(
+        "location",
+        lambda location, row: {"location": location, "recorded": row["recorded"].lower() == "true", "countries": []},
+        children="countries",
+    ),
+    Level("country_name", lambda country, row: {"name": country, "type_of_contract": []}, children="type_of_contract"),
+    Level("contract_type", create_contract),
+]
+
+
+class TableRows:
+    """Rows of the input table that can be iterated repeatedly, each iteration reads the file again."""
+
+    def __init__(
+        self,
+        path: str,
+        skip_rows: Optional[Set[int]] = None,
+        metrics: Optional[PerformanceMetrics] = None,
+    ):
+        self.path = path
+        self.skip_rows = skip_rows
+        self.metrics = metrics
+
+    def __iter__(self) -> Iterator[dict]:
+        rows = Component.read_rows(self.path, self.skip_rows)
+        return self.metrics.timed(rows, "csv_read") if self.metrics else rows
 
 
 class Component(ComponentBase):
@@ -23,13 +154,57 @@ class Component(ComponentBase):
         super().__init__()
         self.params = Configuration(**self.configuration.parameters)
         self.client = None
+        self.token_provider = None
+        self.invalid_rows = set()
+        self.normalization_plan = None
+        self.state = self.get_state_file()
+        # the objects needed only by the imports are created in `run`, so the sync actions start quickly
+        self.checkpoints = None
+        self.fingerprints = None
+        self.input_fingerprint = None
+
+    @cached_property
+    def session(self):
+        return create_session(pool_size=self.params.pool_size, keep_alive=self.params.keep_alive)
+
+    @cached_property
+    def rate_limiter(self) -> AdaptiveRateLimiter:
+        # shared by all clients of the run, so throttling seen by one of them slows down all of them
+        return AdaptiveRateLimiter(
+            requests_per_second=self.params.max_requests_per_second or None, max_concurrency=self.params.pool_size
+        )
+
+    @cached_property
+    def retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(max_retries=self.params.max_retries)
+
+    @cached_property
+    def cache(self) -> ResponseCache:
+        cache = ResponseCache(self.state.get("api_cache"), ttl=self.params.cache_ttl)
+        if self.params.clear_cache:
+            cache.invalidate()
+        return cache
+
+    @cached_property
+    def metrics(self) -> PerformanceMetrics:
+        return PerformanceMetrics()
 
     def run(self):
-        self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+        if not self.params.multi_entity and not self.params.entity_period:
+            # the sync actions run before it is selected, so it is required only here
+            raise UserException(
+                "Please select the reporting period and entity, or enable multiple entities and reporting periods."
+            )
+        # the rows are validated against the current template, a stale one could drop valid rows from an import
+        # that replaces all stored rows, the cached responses serve only the sync actions
+        self.cache.invalidate()
+        self.checkpoints = UploadCheckpoints(self.state.get("upload_checkpoints"))
+        self.client = self.create_client()
 
         endpoint_to_method = {
             "franchises": self.import_franchises_ui_data,
             "intensity_metrics": self.import_intensity_metrics_ui_data,
+            "investments": self.import_investments_ui_data,
             "water_storage": self.import_water_storage_ui_data,
             "employee_benefits": self.import_employee_benefits_ui_data,
             "social_protection": self.import_social_protection_ui_data,
@@ -49,373 +224,599 @@ class Component(ComponentBase):
             investments_table = [
                 table for table in in_tables if "share_of_equity" in table.schema
             ][0]
-            investments_data = []
-            with open(investments_table.full_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    investments_data.append(row)
-
             finance_table = [
                 table
                 for table in in_tables
                 if "share_of_total_project_cost" in table.schema
             ][0]
-            finance_data = []
-            with open(finance_table.full_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    finance_data.append(row)
-
-            self.import_investments_ui_data(
-                entity_id=self.params.entity_id,
-                reporting_period_id=self.params.reporting_period_id,
-                investments_data=investments_data,
-                finance_data=finance_data,
-            )
+            sources = {
+                "investments_data": investments_table.full_path,
+                "finance_data": finance_table.full_path,
+            }
 
         else:
             if len(in_tables) != 1:
                 raise UserException("Please provide exactly 1 table in input mapping.")
 
-            data = []
-            with open(in_tables[0].full_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    data.append(row)
+            sources = {"data": in_tables[0].full_path}
 
-            endpoint_to_method[self.params.endpoint](
-                entity_id=self.params.entity_id,
-                reporting_period_id=self.params.reporting_period_id,
-                data=data,
-            )
+        import_method = endpoint_to_method[self.params.endpoint]
 
-    def refresh_tokens(self) -> str:
-        statefile = self.get_state_file()
-        if (
-            statefile.get("#refresh_token")
-            and statefile.get("auth_id") == self.configuration.oauth_credentials.id
-        ):
-            logging.debug("Using refresh token from state file")
-            refresh_token = statefile.get("#refresh_token")
-        else:
-            logging.debug("Using refresh token from configuration")
-            refresh_token = self.configuration.oauth_credentials.data.get(
-                "refresh_token"
+        if self.params.endpoint == "generic" and self.params.validate_rows:
+            self.validate_input(sources["data"])
+
+        if self.params.endpoint == "generic" and self.params.normalize_values:
+            self.normalization_plan = CoercionPlan.from_template(self.get_template())
+
+        if self.params.endpoint == "generic" and self.params.diff_mode:
+            self.fingerprints = self.load_fingerprints()
+
+        if self.params.endpoint == "generic" and self.params.batch_size > 0 and self.params.resume_uploads:
+            self.input_fingerprint = file_fingerprint(
+                sources["data"],
+                self.params.batch_size,
+                self.params.normalize_values,
+                self.params.validate_rows,
+                self.params.diff_mode,
             )
 
-        client_id = self.configuration.oauth_credentials.appKey
-        client_secret = self.configuration.oauth_credentials.appSecret
+        try:
+            if self.params.async_mode:
+                asyncio.run(self.run_async(import_method, sources))
+            elif self.params.multi_entity:
+                self.import_partitions(import_method, sources)
+            else:
+                import_method(
+                    entity_id=self.params.entity_id,
+                    reporting_period_id=self.params.reporting_period_id,
+                    **self.table_rows(sources),
+                )
+        except Exception:
+            # keep the acknowledged batches, so the next run with the same input resumes after them
+            self.save_state()
+            raise
+        finally:
+            self.save_fingerprints()
+            self.report_performance()
+
+        self.checkpoints.clear()
+        self.client.log_transfer_summary()
+
+        # the token provider may have rotated the tokens during a long import
+        self.save_state()
+
+    async def run_async(self, import_method: Callable, sources: dict[str, str]) -> None:
+        """Run the import on a single thread with the asyncio client.
+
+        The import methods return coroutines when `self.client` is an AsyncEsgClient, the row transformations
+        stay the same for both clients.
+        """
+        # imported only by the asyncio runs, so the sync actions do not pay for it
+        from common.src.async_esg_client import AsyncEsgClient
+
+        sync_client = self.client
+        async with AsyncEsgClient(
+            self.environment_variables.component_id,
+            cache=self.cache,
+            token_provider=self.token_provider,
+            timeout=self.params.timeout,
+            max_concurrency=self.params.pool_size,
+            rate_limiter=self.rate_limiter,
+            retry_policy=self.retry_policy,
+            content_encoding=self.params.compression,
+            metrics=self.metrics,
+        ) as client:
+            self.client = client
+            try:
+                if self.params.multi_entity:
+                    await self.import_partitions_async(import_method, sources)
+                else:
+                    await self.completed(
+                        import_method(
+                            entity_id=self.params.entity_id,
+                            reporting_period_id=self.params.reporting_period_id,
+                            **self.table_rows(sources),
+                        )
+                    )
+                client.log_transfer_summary()
+            finally:
+                self.client = sync_client
+
+    async def import_partitions_async(self, import_method: Callable, sources: dict[str, str]) -> None:
+        """Asyncio variant of `import_partitions`, at most `max_workers` partitions are imported at once."""
+        partitions = self.partition_rows(sources)
+        logging.info(
+            f"Importing data for {len(partitions)} entity and reporting period combinations "
+            f"with up to {self.params.max_workers} concurrent imports..."
+        )
+        slots = asyncio.Semaphore(self.params.max_workers)
+
+        async def import_partition(entity_id: int, period_id: int, data: dict) -> None:
+            async with slots:
+                await self.completed(import_method(entity_id=entity_id, reporting_period_id=period_id, **data))
 
-        url = "https://login.microsoftonline.com/277a3012-4462-4bb3-90ee-986a2006ebeb/oauth2/v2.0/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-        }
+        keys = list(partitions)
+        results = await asyncio.gather(
+            *(import_partition(*key, partitions.pop(key)) for key in keys), return_exceptions=True
+        )
+
+        failed = []
+        for (entity_id, period_id), result in zip(keys, results):
+            if isinstance(result, Exception):
+                logging.error(f"Import for entity {entity_id} and reporting period {period_id} failed: {result}")
+                failed.append(f"{entity_id}-{period_id}")
+        self.raise_for_failed_partitions(failed)
+
+    def import_partitions(self, import_method: Callable, sources: dict[str, str]) -> None:
+        """Split the input rows by entity and reporting period and import the partitions concurrently.
+
+        Every input table must contain the `entity_id` and `reporting_period_id` columns, they are removed
+        from the rows before the import. All partitions share the same ESG client.
+
+        Args:
+            import_method: Import method of the configured endpoint
+            sources: Mapping of the import method data arguments to the input table paths
+        """
+        partitions = self.partition_rows(sources)
+        logging.info(
+            f"Importing data for {len(partitions)} entity and reporting period combinations "
+            f"using {self.params.max_workers} workers..."
+        )
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.params.max_workers) as executor:
+            futures = {
+                executor.submit(import_method, entity_id=entity_id, reporting_period_id=period_id, **data): (
+                    entity_id,
+                    period_id,
+                )
+                for (entity_id, period_id), data in partitions.items()
+            }
+            partitions.clear()
 
-        response = requests.post(url, headers=headers, data=payload)
-        if response.status_code != 200:
+            for future in as_completed(futures):
+                entity_id, period_id = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Import for entity {entity_id} and reporting period {period_id} failed: {e}")
+                    failed.append(f"{entity_id}-{period_id}")
+
+        self.raise_for_failed_partitions(failed)
+
+    @staticmethod
+    def raise_for_failed_partitions(failed: list[str]) -> None:
+        if failed:
             raise UserException(
-                f"Unable to refresh access token. Status code: {response.status_code} "
-                f"Reason: {response.reason}, message: {response.json()}"
+                f"Import failed for {len(failed)} entity-reporting period combinations: {', '.join(failed)}"
             )
-        data = response.json()
-        self.write_state_file(
-            {
-                "#refresh_token": data["refresh_token"],
-                "auth_id": self.configuration.oauth_credentials.id,
-            }
+
+    def table_rows(self, sources: dict[str, str]) -> dict[str, TableRows]:
+        return {
+            argument: TableRows(path, self.invalid_rows, self.metrics)
+            for argument, path in sources.items()
+        }
+
+    def partition_rows(self, sources: dict[str, str]) -> dict[tuple[int, int], dict[str, list]]:
+        partitions = {}
+        for argument, path in sources.items():
+            for row in self.metrics.timed(self.read_rows(path, self.invalid_rows), "csv_read"):
+                try:
+                    key = (int(row.pop(ENTITY_ID_COLUMN)), int(row.pop(REPORTING_PERIOD_ID_COLUMN)))
+                except (KeyError, TypeError, ValueError):
+                    raise UserException(
+                        f"Multi entity mode requires numeric '{ENTITY_ID_COLUMN}' and "
+                        f"'{REPORTING_PERIOD_ID_COLUMN}' columns in every input table."
+                    )
+                partitions.setdefault(key, {name: [] for name in sources})[argument].append(row)
+        return partitions
+
+    @staticmethod
+    def read_rows(path: str, skip_rows: Optional[Set[int]] = None) -> Iterator[dict]:
+        """Lazily read rows of the input table, the file is open only while the rows are consumed.
+
+        Args:
+            path: Path of the input table
+            skip_rows: Numbers of rows to leave out, rows are numbered from 1
+        """
+        rows = read_csv_rows(path)
+        if not skip_rows:
+            yield from rows
+            return
+        for row_number, row in enumerate(rows, start=1):
+            if row_number not in skip_rows:
+                yield row
+
+    def validate_input(self, path: str) -> None:
+        """Validate the generic template input against the template structure before anything is sent.
+
+        Invalid rows are written to the `invalid_rows` output table together with their errors and are
+        left out of the import. Rows with only warnings, e.g. dates the validator cannot parse, are written
+        there too, but they are imported.
+        """
+        template = self.get_template()
+        lookup_names = TemplateValidator.get_lookup_names(template)
+        with ThreadPoolExecutor(max_workers=self.params.max_workers) as executor:
+            lookups = dict(zip(lookup_names, executor.map(self.client.get_lookup_data, lookup_names)))
+        validator = TemplateValidator(
+            template,
+            {name: {str(value) for value in values} for name, values in lookups.items()},
+            period_start=self.params.period_start,
+            period_end=self.params.period_end,
         )
-        return data["id_token"]
+        if validator.checks_period and not (self.params.period_start or self.params.period_end):
+            logging.warning(
+                "The reporting period start and end are not configured, dates of the columns that must be "
+                "in the reporting period are only checked to be valid dates."
+            )
+
+        out_table = self.create_out_table_definition("invalid_rows.csv")
+        warned_rows = 0
+        with (
+            self.metrics.stage("validate"),
+            open(path, "r", encoding="utf-8") as f,
+            open(out_table.full_path, "w", newline="") as out,
+        ):
+            reader = csv.DictReader(f)
+            writer = csv.DictWriter(out, fieldnames=["row_number", *reader.fieldnames, "errors", "imported"])
+            writer.writeheader()
+            for row_number, row, errors, warnings in validator.find_invalid_rows(reader):
+                writer.writerow(
+                    {"row_number": row_number, **row, "errors": "; ".join(errors + warnings), "imported": not errors}
+                )
+                if errors:
+                    self.invalid_rows.add(row_number)
+                else:
+                    warned_rows += 1
+
+        self.write_manifest(out_table)
+        if self.invalid_rows:
+            logging.warning(
+                f"{len(self.invalid_rows)} rows failed validation against the template and will not be imported, "
+                f"see the invalid_rows table."
+            )
+        if warned_rows:
+            logging.warning(
+                f"{warned_rows} rows could not be fully validated and will be imported, see the invalid_rows table."
+            )
+
+    def refresh_tokens(self) -> str:
+        if self.token_provider is None:
+            credentials = self.configuration.oauth_credentials
+            self.token_provider = TokenProvider(
+                self.state,
+                auth_id=credentials.id,
+                app_key=credentials.appKey,
+                app_secret=credentials.appSecret,
+                refresh_token=credentials.data.get("refresh_token"),
+                session=self.session,
+            )
+
+        with self.metrics.stage("token_refresh"):
+            id_token = self.token_provider.get_id_token()
+        if self.token_provider.refreshed:
+            self.save_state()
+        return id_token
+
+    def create_client(self) -> EsgClient:
+        return EsgClient(
+            self.environment_variables.component_id,
+            self.refresh_tokens(),
+            self.cache,
+            self.token_provider,
+            session=self.session,
+            timeout=(DEFAULT_CONNECT_TIMEOUT, self.params.timeout),
+            rate_limiter=self.rate_limiter,
+            retry_policy=self.retry_policy,
+            content_encoding=self.params.compression,
+            metrics=self.metrics,
+        )
+
+    def report_performance(self) -> None:
+        """Log the durations and transferred bytes of the run stages, optionally also as an output table."""
+        self.metrics.log_summary()
+        if self.params.performance_report:
+            out_table = self.create_out_table_definition("performance_report.csv")
+            self.metrics.write_report(out_table.full_path)
+            self.write_manifest(out_table)
+
+    def save_state(self) -> None:
+        self.state["api_cache"] = self.cache.to_dict()
+        if self.checkpoints is not None:
+            self.state["upload_checkpoints"] = self.checkpoints.to_dict()
+        # fingerprints were kept in the state by previous versions
+        self.state.pop("row_fingerprints", None)
+        self.write_state_file(self.state)
+
+    @property
+    def fingerprints_tag(self) -> str:
+        """Tag of the fingerprints file of this configuration row, runs of other rows must not replace it."""
+        ids = (self.environment_variables.config_id, self.environment_variables.config_row_id)
+        return "-".join([FINGERPRINTS_FILE_TAG, *(str(i) for i in ids if i)])
+
+    def load_fingerprints(self) -> FingerprintIndex:
+        """Load the row fingerprints saved by the previous run of this row from the latest tagged input file."""
+        settings = f"normalize_values={self.params.normalize_values}"
+        tag = self.fingerprints_tag
+        in_files = self.get_input_files_definitions(tags=[tag])
+        if not in_files:
+            logging.warning(f"No file tagged {tag} found in the input mapping, all rows will be imported.")
+            return FingerprintIndex(settings)
+        return FingerprintIndex.load(in_files[0].full_path, settings)
+
+    def save_fingerprints(self) -> None:
+        """Save the row fingerprints as a tagged output file, also when the run fails after some imports."""
+        if self.fingerprints is None:
+            return
+        tag = self.fingerprints_tag
+        out_file = self.create_out_file_definition(f"{tag}.zip", tags=[FINGERPRINTS_FILE_TAG, tag])
+        self.fingerprints.save(out_file.full_path)
+        self.write_manifest(out_file)
+
+    @staticmethod
+    async def completed(result):
+        """Await the result of an import method, which is not awaitable when the import was skipped."""
+        if inspect.isawaitable(result):
+            return await result
+        return result
+
+    @staticmethod
+    def log_result(result, message: Callable = str, on_done: Optional[Callable] = None):
+        """Log the result of a client call, awaiting it first when the client is asynchronous.
+
+        `on_done` is called once the call succeeded.
+        """
+        if inspect.isawaitable(result):
+            async def log_when_done():
+                done = await result
+                logging.info(message(done))
+                if on_done:
+                    on_done()
+                return done
+
+            return log_when_done()
+
+        logging.info(message(result))
+        if on_done:
+            on_done()
+        return result
 
     def import_franchises_ui_data(self, entity_id, reporting_period_id, data):
-        result = self.client.import_franchises_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            franchises_data=data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        return self.log_result(
+            self.client.import_franchises_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                franchises_data=data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_intensity_metrics_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        processed_data = []
-        for row in data:
-            processed_row = {}
-            for key, value in row.items():
-                if key in ("emission", "water", "energy"):
-                    processed_row[key] = value.lower() == "true"
-                elif key in ("totalValueReported", "reportedValueInHighClimateSectors"):
-                    try:
-                        processed_row[key] = float(value)
-                    except ValueError:
-                        processed_row[key] = 0.0
-                else:
-                    processed_row[key] = value
-            processed_data.append(processed_row)
-
-        logging.info(
-            f"Importing {len(processed_data)} intensity metrics data to ESG API..."
-        )
-        result = self.client.import_intensity_metrics_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            intensity_metrics_data=processed_data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        processed_data = self.metrics.timed(INTENSITY_METRICS_PLAN.apply(data), "transform")
+
+        logging.info("Importing intensity metrics data to ESG API...")
+        return self.log_result(
+            self.client.import_intensity_metrics_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                intensity_metrics_data=processed_data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_investments_ui_data(
         self,
         entity_id: int,
         reporting_period_id: int,
-        investments_data: list,
-        finance_data: list,
+        investments_data: Iterable[dict],
+        finance_data: Iterable[dict],
     ):
-        result = self.client.import_investments_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            equity_investments_data=investments_data,
-            project_finance_data=finance_data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        return self.log_result(
+            self.client.import_investments_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                equity_investments_data=investments_data,
+                project_finance_data=finance_data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_water_storage_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        result = self.client.import_water_storage_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            water_storage_data=data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        return self.log_result(
+            self.client.import_water_storage_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                water_storage_data=data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_employee_benefits_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        grouped_data = {}
-        for row in data:
-            location = row["location"]
-            sig_location = row["significant_location"]
-
-            if location not in grouped_data:
-                grouped_data[location] = {}
-
-            if sig_location not in grouped_data[location]:
-                grouped_data[location][sig_location] = []
-
-            grouped_data[location][sig_location].append(row)
-
-        # Transform the grouped data into the API structure
-        result_data = []
-        benefit_types = [
-            "disabilityCoverage",
-            "healthCare",
-            "lifeInsurance",
-            "other",
-            "parentalLeave",
-            "retirementProvision",
-            "stockOwnership",
-        ]
-
-        def create_empty_benefit_data():
-            return {
-                "fullTimeEmployeesWithPermanentContract": 0,
-                "partTimeEmployeesWithPermanentContract": 0,
-                "fullTimeEmployeesWithTemporaryContract": 0,
-                "partTimeEmployeesWithTemporaryContract": 0,
-            }
-
-        for location, sig_locations in grouped_data.items():
-            location_data = {"location": location, "significantLocations": []}
-
-            for sig_location, rows in sig_locations.items():
-                sig_location_data = {"significantLocation": sig_location}
-
-                for benefit_type in benefit_types:
-                    sig_location_data[benefit_type] = create_empty_benefit_data()
-
-                for row in rows:
-                    benefit_type = row["benefit_type"]
-                    if benefit_type in benefit_types:
-                        sig_location_data[benefit_type] = {
-                            "fullTimeEmployeesWithPermanentContract": row["full_time_permanent"],
-                            "partTimeEmployeesWithPermanentContract": row["part_time_permanent"],
-                            "fullTimeEmployeesWithTemporaryContract": row["full_time_temporary"],
-                            "partTimeEmployeesWithTemporaryContract": row["part_time_temporary"],
-                        }  # fmt: skip
-
-                location_data["significantLocations"].append(sig_location_data)
-
-            result_data.append(location_data)
-
-        logging.info(
-            f"Importing employee benefits data for {len(result_data)} locations to ESG API..."
-        )
-        result = self.client.import_benefit_for_employees_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            employee_benefits_data=result_data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        result_data = self.group_rows(data, EMPLOYEE_BENEFITS_LEVELS, "employee benefits")
+        return self.log_result(
+            self.client.import_benefit_for_employees_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                employee_benefits_data=result_data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_social_protection_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        location_groups = {}
-        for row in data:
-            location = row["location"]
-            if location not in location_groups:
-                location_groups[location] = []
-            location_groups[location].append(row)
-
-        result_data = []
-
-        for location, rows in location_groups.items():
-            recorded = rows[0]["recorded"].lower() == "true"
-
-            location_data = {
-                "location": location,
-                "recorded": recorded,
-                "countries": [],
-            }
+        result_data = self.group_rows(data, SOCIAL_PROTECTION_LEVELS, "social protection")
+        return self.log_result(
+            self.client.import_social_protection_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                social_protection_data=result_data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
+        )
 
-            country_groups = {}
-            for row in rows:
-                country_name = row["country_name"]
-                if country_name not in country_groups:
-                    country_groups[country_name] = []
-                country_groups[country_name].append(row)
-
-            for country_name, country_rows in country_groups.items():
-                country_data = {"name": country_name, "type_of_contract": []}
-
-                contract_groups = {}
-                for row in country_rows:
-                    contract_type = row["contract_type"]
-                    if contract_type not in contract_groups:
-                        contract_groups[contract_type] = row
-
-                for contract_type, row in contract_groups.items():
-                    contract_data = {
-                        "name": contract_type,
-                        "sickness": {
-                            "employees": int(row["sickness_employees"]),
-                            "other_worker": int(row["sickness_other_worker"]),
-                        },
-                        "employmentInjuryAndDisability": {
-                            "employees": int(row["employment_injury_disability_employees"]),
-                            "other_worker": int(row["employment_injury_disability_other_worker"]),
-                        },
-                        "parentalLeave": {
-                            "employees": int(row["parental_leave_employees"]),
-                            "other_worker": int(row["parental_leave_other_worker"]),
-                        },
-                        "unemploymentStartingFrom": {
-                            "employees": int(row["unemployment_employees"]),
-                            "other_worker": int(row["unemployment_other_worker"]),
-                        },
-                        "retirement": {
-                            "employees": int(row["retirement_employees"]),
-                            "other_worker": int(row["retirement_other_worker"]),
-                        },
-                    }  # fmt: skip
-
-                    country_data["type_of_contract"].append(contract_data)
-
-                location_data["countries"].append(country_data)
-
-            result_data.append(location_data)
+    def group_rows(self, data: Iterable[dict], levels: list[Level], name: str) -> Iterable[dict]:
+        """Group the rows into the location hierarchy, presorted input is streamed location by location."""
+        if self.params.presorted_input:
+            logging.info(f"Importing {name} data to ESG API...")
+            return self.metrics.timed(group_rows(data, levels, presorted=True), "transform")
 
-        logging.info(
-            f"Importing social protection data for {len(result_data)} locations to ESG API..."
-        )
-        result = self.client.import_social_protection_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            social_protection_data=result_data,
-            data_not_available=False,
-            data_not_available_comment=None,
-        )
-        logging.info(result)
+        with self.metrics.stage("transform"):
+            result_data = list(group_rows(data, levels))
+        logging.info(f"Importing {name} data for {len(result_data)} locations to ESG API...")
+        return result_data
 
     def import_non_compliance_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        processed_data = []
-        for row in data:
-            processed_row = {}
-            for key, value in row.items():
-                if key == "NumberOfIncidents":
-                    processed_row[key] = int(value)
-                elif key == "MonetaryValue":
-                    processed_row[key] = float(value)
-                else:
-                    processed_row[key] = value
-            processed_data.append(processed_row)
-
-        logging.info(
-            f"Importing {len(processed_data)} non-compliance incidents to ESG API..."
-        )
-        result = self.client.import_non_compliance_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            non_compliance_data=processed_data,
-            data_not_available=False,
-            data_not_available_comment=None,
+        processed_data = self.metrics.timed(NON_COMPLIANCE_PLAN.apply(data), "transform")
+
+        logging.info("Importing non-compliance incidents to ESG API...")
+        return self.log_result(
+            self.client.import_non_compliance_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                non_compliance_data=processed_data,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
 
     def import_locations_ui_data(
-        self, entity_id: int, reporting_period_id: int, data: list
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
     ):
-        processed_data = []
-        for row in data:
-            location_entry = {
+        processed_data = (
+            {
                 "location": row["location"],
                 "enviromentalInputtemplateId": [int(x) for x in row["environmental_template_ids"].split(";")],
                 "governanceInputtemplateId": [int(x) for x in row["governance_template_ids"].split(";")],
                 "socialInputtemplateId": [int(x) for x in row["social_template_ids"].split(";")],
-            }  # fmt: skip
-            processed_data.append(location_entry)
-
-        logging.info(f"Importing {len(processed_data)} locations to ESG API...")
-        result = self.client.import_locations_ui_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            locations_data=processed_data,
-            ignore_locations=False,
-            data_not_available=False,
-            data_not_available_comment=None,
+            }
+            for row in data
+        )  # fmt: skip
+        processed_data = self.metrics.timed(processed_data, "transform")
+
+        logging.info("Importing locations to ESG API...")
+        return self.log_result(
+            self.client.import_locations_ui_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                locations_data=processed_data,
+                ignore_locations=False,
+                data_not_available=False,
+                data_not_available_comment=None,
+            )
         )
-        logging.info(result)
-
-    def import_generic_data(self, entity_id: int, reporting_period_id: int, data: list):
-        result = self.client.import_generic_data(
-            entity_id=entity_id,
-            reporting_period_id=reporting_period_id,
-            template_id=self.params.template_id,
-            data=data,
+
+    def import_generic_data(
+        self, entity_id: int, reporting_period_id: int, data: Iterable[dict]
+    ):
+        append = False
+        on_done = None
+        if self.params.diff_mode:
+            data, append, on_done = self.diff_rows(
+                self.checkpoints.key(self.params.template_id, entity_id, reporting_period_id), data
+            )
+            if data is None:
+                logging.info(
+                    f"Rows for entity {entity_id} and reporting period {reporting_period_id} did not change "
+                    f"since the previous run, nothing to import."
+                )
+                return None
+
+        if self.normalization_plan:
+            data = self.metrics.timed(self.normalization_plan.apply(data), "transform")
+
+        if self.params.batch_size > 0:
+            progress = None
+            if self.input_fingerprint:
+                key = self.checkpoints.key(self.params.template_id, entity_id, reporting_period_id)
+                progress = self.checkpoints.progress(key, self.input_fingerprint)
+                if progress.acknowledged:
+                    logging.info(
+                        f"Resuming import for entity {entity_id} and reporting period {reporting_period_id} "
+                        f"after {progress.acknowledged} batches imported by a previous run."
+                    )
+            return self.log_result(
+                self.client.import_generic_data_in_batches(
+                    entity_id=entity_id,
+                    reporting_period_id=reporting_period_id,
+                    template_id=self.params.template_id,
+                    data=data,
+                    batch_size=self.params.batch_size,
+                    max_concurrent_batches=self.params.concurrent_batches,
+                    progress=progress,
+                    append=append,
+                ),
+                lambda results: f"Imported generic data to ESG API in {len(results)} batches.",
+                on_done,
+            )
+
+        return self.log_result(
+            self.client.import_generic_data(
+                entity_id=entity_id,
+                reporting_period_id=reporting_period_id,
+                template_id=self.params.template_id,
+                data=data,
+                # without the flag the single request replaces the stored rows
+                append=True if append else None,
+            ),
+            on_done=on_done,
         )
-        logging.info(result)
+
+    def diff_rows(self, key: str, data: Iterable[dict]) -> tuple[Optional[Iterable[dict]], bool, Callable]:
+        """Reduce the rows to those not sent by the previous successful run, see `RowDiff`.
+
+        Returns:
+            Rows to send, None when nothing changed, whether to append them to the stored rows, and
+            a callback recording the fingerprints of the rows once they are imported
+        """
+        previous = self.fingerprints.get(key)
+        if previous is None:
+            digests = array("Q")
+            digested = self.metrics.timed(record_digests(data, digests), "diff")
+            return digested, False, lambda: self.fingerprints.set(key, digests)
+
+        with self.metrics.stage("diff"):
+            if iter(data) is data:
+                # all rows are sent when too many of them changed, so they have to be readable twice
+                data = list(data)
+            diff = RowDiff(previous, data)
+        on_done = partial(self.fingerprints.set, key, diff.digests)
+        if not diff.complete:
+            logging.info(f"Rows of {key} were changed or deleted since the previous run, importing all rows.")
+            return data, False, on_done
+        if not diff.inserted:
+            return None, False, on_done
+
+        logging.info(f"Importing {len(diff.inserted)} of {len(diff.digests)} rows of {key}, the rest did not change.")
+        return diff.inserted, True, on_done
+
+    def get_template(self) -> dict:
+        for template in self.client.get_template_structure():
+            if template.get("templateId") == self.params.template_id:
+                return template
+        raise UserException(f"Template {self.params.template_id} not found in the ESG template structure.")
 
     @sync_action("list_clients")
     def list_clients(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             clients = self.client.get_clients()
+            self.save_state()
             return [
                 SelectElement(value=f"{client['id']}-{client['name']}")
                 for client in clients
@@ -425,8 +826,9 @@ class Component(ComponentBase):
     def list_entities_with_periods(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             data = self.client.get_entities_with_periods(self.params.client_id)
+            self.save_state()
 
             return [
                 SelectElement(value=f"{pid}-{pname}   {eid}-{ename}")
@@ -438,8 +840,9 @@ class Component(ComponentBase):
     def list_entities(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             entities = self.client.get_entities(self.params.client_id)
+            self.save_state()
             return [
                 SelectElement(value=f"{value}-{label}")
                 for value, label in entities.items()
@@ -449,8 +852,9 @@ class Component(ComponentBase):
     def list_reporting_periods(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             entities = self.client.get_reporting_periods(self.params.client_id)
+            self.save_state()
             return [
                 SelectElement(value=f"{value}-{label}")
                 for value, label in entities.items()
@@ -460,8 +864,9 @@ class Component(ComponentBase):
     def list_templates(self) -> list[SelectElement]:
         out = StringIO()
         with pipes(stdout=out, stderr=out):
-            self.client = EsgClient(self.environment_variables.component_id, self.refresh_tokens())
+            self.client = self.create_client()
             templates = self.client.get_template_structure()
+            self.save_state()
             return [
                 SelectElement(value=f"{val['templateId']}-{val['templateName']}")
                 for val in templates
@@ -475,7 +880,14 @@ if __name__ == "__main__":
     try:
         comp = Component()
         # this triggers the run method by default and is controlled by the configuration.action parameter
-        comp.execute_action()
+        if comp.params.profile:
+            # imported only when profiling, so the sync actions do not pay for it
+            from common.src.profiling import RunProfiler
+
+            with RunProfiler(comp):
+                comp.execute_action()
+        else:
+            comp.execute_action()
     except UserException as exc:
         logging.exception(exc)
         exit(1)
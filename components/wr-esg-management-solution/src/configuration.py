@@ -1,5 +1,7 @@
 import logging
 import re
+from datetime import date
+from typing import Optional
 
 from keboola.component.exceptions import UserException
 from pydantic import BaseModel, ValidationError, field_validator, model_validator
@@ -12,6 +14,28 @@ class Configuration(BaseModel):
     entity_id: int = 0
     endpoint: str = ""
     template_id: str = ""
+    batch_size: int = 0
+    concurrent_batches: int = 1
+    resume_uploads: bool = False
+    diff_mode: bool = False
+    normalize_values: bool = False
+    validate_rows: bool = False
+    period_start: Optional[date] = None
+    period_end: Optional[date] = None
+    presorted_input: bool = False
+    multi_entity: bool = False
+    max_workers: int = 4
+    async_mode: bool = False
+    cache_ttl: int = 3600
+    clear_cache: bool = False
+    pool_size: int = 10
+    keep_alive: bool = True
+    timeout: int = 300
+    max_requests_per_second: float = 0
+    max_retries: int = 5
+    compression: str = "none"
+    performance_report: bool = False
+    profile: bool = False
     debug: bool = False
 
     @field_validator("client_id", "template_id")
@@ -20,6 +44,10 @@ class Configuration(BaseModel):
             return int(v.split("-", 1)[0])
         return v
 
+    @field_validator("period_start", "period_end", mode="before")
+    def empty_date_to_none(cls, v):
+        return v or None
+
     @model_validator(mode="after")
     def extract_entity_period_ids(self):
         if not self.entity_period:
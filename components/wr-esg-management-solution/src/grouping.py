@@ -0,0 +1,81 @@
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+from keboola.component.exceptions import UserException
+
+
+class Level:
+    """One level of a hierarchy built from flat rows.
+
+    Args:
+        key: Column whose value identifies the group of the level
+        create: Builds the node of a group from its key and first row
+        add: Adds each row of the group to the node, used on the last level
+        children: Field of the node the nodes of the next level are appended to
+    """
+
+    def __init__(
+        self,
+        key: str,
+        create: Callable[[Any, Dict[str, Any]], Dict[str, Any]],
+        add: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+        children: Optional[str] = None,
+    ):
+        self.key = key
+        self.create = create
+        self.add = add
+        self.children = children
+
+
+class _Group:
+    __slots__ = ("node", "subgroups")
+
+    def __init__(self, node: Dict[str, Any]):
+        self.node = node
+        self.subgroups: Dict[Hashable, "_Group"] = {}
+
+
+def group_rows(
+    rows: Iterable[Dict[str, Any]], levels: List[Level], presorted: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """Build the nodes of the top level in a single pass over the rows, groups keep the order of first appearance.
+
+    Each row is looked up level by level in the index of the groups, so the whole hierarchy is built
+    in O(n). With `presorted` rows, i.e. rows ordered by the key of the top level, a top level node
+    is yielded as soon as its group ends and only the current group is held in memory.
+    """
+    groups: Dict[Hashable, _Group] = {}
+    finished = set()
+    current_key = None
+
+    for row in rows:
+        key = row[levels[0].key]
+        if presorted and key != current_key:
+            if current_key is not None:
+                finished.add(current_key)
+                yield groups.pop(current_key).node
+            if key in finished:
+                raise UserException(
+                    f"Input rows are not sorted by the '{levels[0].key}' column, value '{key}' appears again "
+                    f"after other values."
+                )
+            current_key = key
+
+        _add_row(groups, levels, row)
+
+    for group in groups.values():
+        yield group.node
+
+
+def _add_row(groups: Dict[Hashable, _Group], levels: List[Level], row: Dict[str, Any]) -> None:
+    parent = None
+    for depth, level in enumerate(levels):
+        key = row[level.key]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(level.create(key, row))
+            if parent is not None:
+                parent.node[levels[depth - 1].children].append(group.node)
+        if level.add:
+            level.add(group.node, row)
+        parent = group
+        groups = group.subgroups
@@ -0,0 +1,33 @@
+import csv
+from typing import Dict, Iterator, List, Optional
+
+# buffer of the reader, larger reads mean fewer system calls on multi-GB tables
+READ_BUFFER_SIZE = 1 << 20
+
+
+def read_csv_rows(path: str) -> Iterator[Dict[str, Optional[str]]]:
+    """Lazily read the rows of a CSV file with a header as dicts, like `csv.DictReader`.
+
+    The rows are parsed with `csv.reader`, avoiding the per row overhead of `DictReader`.
+    """
+    with open(path, "r", encoding="utf-8", newline="", buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        width = len(header)
+        for row in reader:
+            if len(row) == width:
+                yield dict(zip(header, row))
+            elif row:
+                yield _uneven_row(header, row)
+
+
+def _uneven_row(header: List[str], row: List[str]) -> Dict[str, Optional[str]]:
+    """Row of a different length than the header, filled and overflowing the same way as in `csv.DictReader`."""
+    result = dict(zip(header, row))
+    if len(row) > len(header):
+        result[None] = row[len(header):]
+    for name in header[len(row):]:
+        result[name] = None
+    return result
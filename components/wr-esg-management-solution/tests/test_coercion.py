@@ -0,0 +1,62 @@
+import unittest
+
+from common.src.coercion import CoercionPlan, to_bool, to_float_or_zero
+
+TEMPLATE = {
+    "columnsConfiguration": [
+        {"columnType": "Number", "dbColumnName": "Amount", "numberCondition": "Positive"},
+        {"columnType": "Number", "dbColumnName": "Count", "numberCondition": "PositiveInteger"},
+        {"columnType": "Boolean", "excelColumnName": "Is Active"},
+        {"columnType": "Lookup", "dbColumnName": "Country", "lookupName": "Countries"},
+    ]
+}
+
+
+class TestCoercionPlan(unittest.TestCase):
+    def test_static_plan_matches_per_cell_conversion(self):
+        plan = CoercionPlan({"flag": to_bool, "value": to_float_or_zero})
+        rows = [{"flag": "True", "value": "1.5", "name": "a"}, {"flag": "no", "value": "", "name": "b"}, {"name": "c"}]
+
+        self.assertEqual(
+            list(plan.apply(rows)),
+            [{"flag": True, "value": 1.5, "name": "a"}, {"flag": False, "value": 0.0, "name": "b"}, {"name": "c"}],
+        )
+
+    def test_static_plan_raises_conversion_errors(self):
+        plan = CoercionPlan({"NumberOfIncidents": int})
+
+        with self.assertRaises(ValueError):
+            list(plan.apply([{"NumberOfIncidents": "many"}]))
+
+    def test_plan_from_template(self):
+        rows = [{"Amount": "10.50", "Count": "3.0", "Is Active": "TRUE", "Country": "CZ", "Note": 5}]
+
+        self.assertEqual(
+            list(CoercionPlan.from_template(TEMPLATE).apply(rows)),
+            [{"Amount": "10.5", "Count": "3", "Is Active": "true", "Country": "CZ", "Note": 5}],
+        )
+
+    def test_numbers_keep_all_digits(self):
+        rows = [{"Amount": "12345678901234567", "Count": "1e3"}, {"Amount": "0.000001", "Count": "120"}]
+
+        self.assertEqual(
+            list(CoercionPlan.from_template(TEMPLATE).apply(rows)),
+            [{"Amount": "12345678901234567", "Count": "1000"}, {"Amount": "0.000001", "Count": "120"}],
+        )
+
+    def test_values_not_matching_column_type_sent_unchanged(self):
+        rows = [
+            {"Amount": "n/a", "Count": "3.7", "Is Active": "maybe"},
+            {"Amount": "", "Count": "", "Is Active": ""},
+            {"Amount": "inf", "Count": None},
+        ]
+
+        with self.assertLogs(level="WARNING") as logs:
+            converted = list(CoercionPlan.from_template(TEMPLATE).apply(rows))
+
+        self.assertEqual(converted, rows)
+        self.assertIn("Amount: 2, Count: 1, Is Active: 1", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,12 +4,21 @@ Created on 12. 11. 2018
 @author: esner
 """
 
+import csv
+import json
 import os
+import tempfile
+import time
 import unittest
+from datetime import date
 
 import mock
 from component import Component
 from freezegun import freeze_time
+from keboola.component.exceptions import UserException
+
+from common.src.fingerprint import FingerprintIndex, row_digest
+from common.src.metrics import PerformanceMetrics
 
 
 class TestComponent(unittest.TestCase):
@@ -22,6 +31,172 @@ class TestComponent(unittest.TestCase):
             comp = Component()
             comp.run()
 
+    def test_run_requires_entity_period_for_single_entity(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with open(os.path.join(data_dir, "config.json"), "w") as f:
+                json.dump({"parameters": {"endpoint": "generic"}}, f)
+
+            with mock.patch.dict(os.environ, {"KBC_DATADIR": data_dir}), \
+                    mock.patch.object(Component, "create_client") as create_client:
+                with self.assertRaisesRegex(UserException, "reporting period and entity"):
+                    Component().run()
+
+        create_client.assert_not_called()
+
+    def test_run_ignores_cached_template(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with open(os.path.join(data_dir, "config.json"), "w") as f:
+                json.dump({"parameters": {"endpoint": "generic", "multi_entity": True}}, f)
+            os.makedirs(os.path.join(data_dir, "in"))
+            with open(os.path.join(data_dir, "in", "state.json"), "w") as f:
+                json.dump({"api_cache": {"templates": {"stored_at": time.time(), "value": []}}}, f)
+
+            with mock.patch.dict(os.environ, {"KBC_DATADIR": data_dir}), \
+                    mock.patch.object(Component, "create_client", side_effect=RuntimeError) as create_client:
+                component = Component()
+                self.assertEqual(component.cache.get("templates"), [])
+                with self.assertRaises(RuntimeError):
+                    component.run()
+
+        create_client.assert_called_once()
+        self.assertIsNone(component.cache.get("templates"))
+
+    def test_partition_rows_by_entity_and_period(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "in.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("entity_id,reporting_period_id,value\n1,10,a\n2,10,b\n1,10,c\n1,11,d\n")
+
+            component = mock.Mock(read_rows=Component.read_rows, invalid_rows=set(), metrics=PerformanceMetrics())
+            partitions = Component.partition_rows(component, {"data": path})
+
+        self.assertEqual(
+            partitions,
+            {
+                (1, 10): {"data": [{"value": "a"}, {"value": "c"}]},
+                (2, 10): {"data": [{"value": "b"}]},
+                (1, 11): {"data": [{"value": "d"}]},
+            },
+        )
+
+    def test_partition_rows_requires_key_columns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "in.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("entity_id,value\n1,a\n")
+
+            component = mock.Mock(read_rows=Component.read_rows, invalid_rows=set(), metrics=PerformanceMetrics())
+            with self.assertRaises(UserException):
+                Component.partition_rows(component, {"data": path})
+
+    def test_validate_input_checks_dates_against_configured_period(self):
+        template = {"columnsConfiguration": [{"columnType": "Date", "dbColumnName": "Date", "mustBeInPeriod": True}]}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "in.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("Date\n2024-05-01\n2023-12-31\nQ2 2024\n")
+
+            component = mock.Mock(invalid_rows=set(), metrics=PerformanceMetrics())
+            component.get_template.return_value = template
+            component.params.max_workers = 1
+            component.params.period_start, component.params.period_end = date(2024, 1, 1), date(2024, 12, 31)
+            component.create_out_table_definition.return_value = mock.Mock(full_path=os.path.join(tmp, "out.csv"))
+            Component.validate_input(component, path)
+
+            with open(os.path.join(tmp, "out.csv"), newline="") as f:
+                invalid_rows = list(csv.DictReader(f))
+
+        self.assertEqual(component.invalid_rows, {2})
+        self.assertEqual(
+            [(row["row_number"], row["imported"]) for row in invalid_rows], [("2", "False"), ("3", "True")]
+        )
+
+
+
+class TestDiffRows(unittest.TestCase):
+    def setUp(self):
+        self.rows = [{"name": f"row {i}", "value": str(i)} for i in range(10)]
+        self.fingerprints = FingerprintIndex()
+        self.fingerprints.set("3-1-2", [row_digest(row) for row in self.rows])
+        self.component = mock.Mock(fingerprints=self.fingerprints, metrics=PerformanceMetrics())
+
+    def diff_rows(self, rows):
+        data, append, on_done = Component.diff_rows(self.component, "3-1-2", iter(rows))
+        return (None if data is None else list(data)), append, on_done
+
+    def test_inserted_rows_appended(self):
+        rows = self.rows + [{"name": "row 10", "value": "10"}]
+
+        data, append, on_done = self.diff_rows(rows)
+
+        self.assertEqual((data, append), ([rows[-1]], True))
+        on_done()
+        self.assertEqual(len(self.fingerprints.get("3-1-2")), 11)
+
+    def test_changed_row_replaces_all_rows(self):
+        rows = [dict(row) for row in self.rows]
+        rows[3]["value"] = "changed"
+
+        self.assertEqual(self.diff_rows(rows)[:2], (rows, False))
+
+    def test_deleted_row_replaces_all_rows(self):
+        rows = self.rows[:5] + self.rows[6:] + [{"name": "row 10", "value": "10"}]
+
+        self.assertEqual(self.diff_rows(rows)[:2], (rows, False))
+
+    def test_unchanged_rows_not_sent(self):
+        self.assertEqual(self.diff_rows(self.rows)[:2], (None, False))
+
+    def test_unknown_key_sends_all_rows(self):
+        self.fingerprints = FingerprintIndex()
+        self.component.fingerprints = self.fingerprints
+
+        self.assertEqual(self.diff_rows(self.rows)[:2], (self.rows, False))
+
+
+
+class TestFingerprintFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        for folder in ("in/files", "out/files"):
+            os.makedirs(os.path.join(self.data_dir, folder))
+        with open(os.path.join(self.data_dir, "config.json"), "w") as f:
+            json.dump({"parameters": {"endpoint": "generic", "diff_mode": True}}, f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def create_component(self, row_id: str) -> Component:
+        environ = {"KBC_DATADIR": self.data_dir, "KBC_CONFIGID": "123", "KBC_CONFIGROWID": row_id}
+        with mock.patch.dict(os.environ, environ):
+            component = Component()
+            component.fingerprints = component.load_fingerprints()
+            return component
+
+    def pass_output_files(self) -> None:
+        """Move the output files to the input files like a file input mapping of all tagged files."""
+        out_dir, in_dir = os.path.join(self.data_dir, "out", "files"), os.path.join(self.data_dir, "in", "files")
+        for file_id, name in enumerate(sorted(n for n in os.listdir(out_dir) if not n.endswith(".manifest"))):
+            with open(os.path.join(out_dir, f"{name}.manifest")) as f:
+                tags = json.load(f)["tags"]
+            os.replace(os.path.join(out_dir, name), os.path.join(in_dir, f"{file_id}_{name}"))
+            os.remove(os.path.join(out_dir, f"{name}.manifest"))
+            with open(os.path.join(in_dir, f"{file_id}_{name}.manifest"), "w") as f:
+                json.dump({"id": file_id, "name": name, "tags": tags, "created": "2026-10-17T10:00:00+0200"}, f)
+
+    def test_rows_read_only_own_fingerprints(self):
+        for row_id in ("1", "2"):
+            component = self.create_component(row_id)
+            component.fingerprints.set("3-1-2", [int(row_id)])
+            component.save_fingerprints()
+        self.pass_output_files()
+
+        for row_id in ("1", "2"):
+            component = self.create_component(row_id)
+            self.assertEqual(component.fingerprints_tag, f"esg-row-fingerprints-123-{row_id}")
+            self.assertEqual(list(component.fingerprints.get("3-1-2")), [int(row_id)])
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -0,0 +1,360 @@
+import asyncio
+import gzip
+import json
+import time
+import unittest
+from datetime import timedelta
+
+import httpx
+import mock
+import requests
+from keboola.component.exceptions import UserException
+
+from common.src import serialization
+from common.src.async_esg_client import AsyncEsgClient
+from common.src.cache import ResponseCache
+from common.src.checkpoint import UploadCheckpoints
+from common.src.esg_client import BatchProgress, EsgClient
+from common.src.generic_rows import GenericRows
+from common.src.http_session import create_session
+from common.src.rate_limit import RetryPolicy
+from common.src.streaming import SpooledBody, iter_json
+from common.tests.mock_server import MockEsgServer
+
+
+class TestEsgClientBatches(unittest.TestCase):
+    def setUp(self):
+        self.client = EsgClient("keboola.wr-esg-management-solution-stage", "token")
+        self.client.import_generic_data = mock.Mock(return_value={"status": "success"})
+
+    def test_first_batch_replaces_following_append(self):
+        rows = ({"col": i} for i in range(250))
+
+        results = self.client.import_generic_data_in_batches(1, 2, 3, rows, batch_size=100)
+
+        self.assertEqual(len(results), 3)
+        calls = self.client.import_generic_data.call_args_list
+        self.assertEqual([len(c.args[3]) for c in calls], [100, 100, 50])
+        self.assertEqual(calls[0].kwargs, {"append": False})
+        self.assertTrue(all(c.kwargs == {"append": True} for c in calls[1:]))
+
+    def test_single_batch_sent_without_append_flag(self):
+        self.client.import_generic_data_in_batches(1, 2, 3, [{"col": i} for i in range(100)], batch_size=100)
+
+        self.assertEqual(self.client.import_generic_data.call_args.kwargs, {"append": None})
+
+    def test_concurrent_batches_send_all_rows(self):
+        rows = [{"col": i} for i in range(1000)]
+
+        results = self.client.import_generic_data_in_batches(1, 2, 3, rows, batch_size=10, max_concurrent_batches=4)
+
+        self.assertEqual(len(results), 100)
+        sent = [row for c in self.client.import_generic_data.call_args_list for row in c.args[3]]
+        self.assertCountEqual(sent, rows)
+
+    def test_empty_data_sends_single_batch(self):
+        results = self.client.import_generic_data_in_batches(1, 2, 3, [], batch_size=10)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(list(self.client.import_generic_data.call_args.args[3]), [])
+        self.assertEqual(self.client.import_generic_data.call_args.kwargs, {"append": None})
+
+    def test_resumed_upload_skips_acknowledged_batches(self):
+        rows = [{"col": i} for i in range(60)]
+        progress = BatchProgress(acknowledged=2, completed=[3])
+
+        results = self.client.import_generic_data_in_batches(1, 2, 3, rows, batch_size=10, progress=progress)
+
+        self.assertEqual(len(results), 3)
+        calls = self.client.import_generic_data.call_args_list
+        self.assertEqual([next(iter(c.args[3]))["col"] for c in calls], [20, 40, 50])
+        self.assertTrue(all(c.kwargs == {"append": True} for c in calls))
+        self.assertEqual((progress.acknowledged, progress.completed), (6, set()))
+
+    def test_checkpoint_keeps_batches_completed_before_failure(self):
+        checkpoints = UploadCheckpoints()
+        key = checkpoints.key(3, 1, 2)
+        self.client.import_generic_data.side_effect = [{}, {}, Exception("Service unavailable"), {}]
+
+        with self.assertRaises(Exception):
+            self.client.import_generic_data_in_batches(
+                1, 2, 3, [{"col": i} for i in range(50)], batch_size=10, progress=checkpoints.progress(key, "input")
+            )
+
+        self.assertEqual(checkpoints.to_dict()[key], {"fingerprint": "input", "batches": 2, "completed": []})
+        self.assertEqual(checkpoints.progress(key, "input").acknowledged, 2)
+        self.assertEqual(checkpoints.progress(key, "changed input").acknowledged, 0)
+
+    def test_batches_in_flight_recorded_when_middle_batch_fails(self):
+        def import_generic_data(entity_id, reporting_period_id, template_id, batch, append):
+            if next(iter(batch))["col"] == 20:
+                raise Exception("Service unavailable")
+            time.sleep(0.1)
+            return {}
+
+        self.client.import_generic_data.side_effect = import_generic_data
+        progress = BatchProgress()
+
+        with self.assertRaisesRegex(Exception, "Service unavailable"):
+            self.client.import_generic_data_in_batches(
+                1, 2, 3, [{"col": i} for i in range(70)], batch_size=10, max_concurrent_batches=4, progress=progress
+            )
+
+        sent = sorted(next(iter(c.args[3]))["col"] for c in self.client.import_generic_data.call_args_list)
+        self.assertEqual(sent, [0, 10, 20, 30, 40])
+        self.assertEqual((progress.acknowledged, progress.completed), (2, {3, 4}))
+
+    def test_batches_hold_compact_rows(self):
+        rows = ({"a": str(i), "b": "x"} for i in range(25))
+
+        self.client.import_generic_data_in_batches(1, 2, 3, rows, batch_size=10)
+
+        batch = self.client.import_generic_data.call_args.args[3]
+        self.assertEqual(batch.columns, ("a", "b"))
+        self.assertEqual(batch.rows, [(str(i), "x") for i in range(20, 25)])
+
+
+class TestGenericPayload(unittest.TestCase):
+    def setUp(self):
+        self.client = EsgClient("keboola.wr-esg-management-solution-stage", "token")
+        self.payloads = []
+        self.client.post_raw = mock.Mock(side_effect=self.post)
+
+    def post(self, endpoint_path, data, headers, **kwargs):
+        self.payloads.append(json.loads(b"".join(data)))
+        return mock.Mock(status_code=200, text="", content=b"", headers={}, elapsed=timedelta(0))
+
+    def test_first_batch_replaces_following_batches_append(self):
+        self.client.import_generic_data_in_batches(1, 2, 3, [{"col": i} for i in range(25)], batch_size=10)
+
+        self.assertEqual([p["append"] for p in self.payloads], [False, True, True])
+
+    def test_single_request_payload_has_no_append_flag(self):
+        self.client.import_generic_data(1, 2, 3, [{"col": 1}])
+        self.client.import_generic_data_in_batches(1, 2, 3, [{"col": 1}], batch_size=10)
+
+        self.assertTrue(all("append" not in p for p in self.payloads))
+        self.assertEqual(self.payloads[0], self.payloads[1])
+
+
+class TestRequestRetries(unittest.TestCase):
+    def test_only_idempotent_requests_retried_after_read_timeout(self):
+        session = create_session(max_retries=2, backoff_factor=0)
+        with MockEsgServer(latency=0.5) as server:
+            for method, expected_requests in (("GET", 3), ("POST", 1)):
+                with self.subTest(method=method):
+                    server.reset()
+                    with self.assertRaises(requests.RequestException):
+                        session.request(method, server.api_url + "ExternalIntegration/ClientData/GetClientIds",
+                                        data=b"{}", timeout=(1, 0.1))
+                    self.assertEqual(server.stats()["requests"], expected_requests)
+
+    def test_imports_sent_without_read_timeout(self):
+        client = EsgClient("keboola.wr-esg-management-solution", "token", timeout=(5, 60))
+        response = mock.Mock(status_code=200, text="", content=b"", headers={}, elapsed=timedelta(0))
+        client.post_raw = mock.Mock(return_value=response)
+        client.get_raw = mock.Mock(return_value=response)
+
+        client.import_generic_data(1, 2, 3, [{"col": "1"}])
+        client.get_lookup_data("Country")
+
+        self.assertEqual(client.post_raw.call_args.kwargs["timeout"], (5, None))
+        self.assertNotIn("timeout", client.get_raw.call_args.kwargs)
+
+
+class TestAsyncEsgClient(unittest.IsolatedAsyncioTestCase):
+    async def test_import_not_retried_after_read_timeout(self):
+        async with AsyncEsgClient(
+            "keboola.wr-esg-management-solution", "token", retry_policy=RetryPolicy(backoff_factor=0)
+        ) as client:
+            response = mock.Mock(status_code=200, text="", content=b"", headers={}, elapsed=timedelta(0))
+            client.post_raw = mock.AsyncMock(side_effect=httpx.ReadTimeout("timed out"))
+            client.get_raw = mock.AsyncMock(side_effect=[httpx.ReadTimeout("timed out"), response])
+
+            with self.assertRaises(UserException):
+                await client.import_generic_data(1, 2, 3, [{"col": "1"}])
+            await client.get_lookup_data("Country")
+
+        self.assertEqual(client.post_raw.call_count, 1)
+        self.assertIsNone(client.post_raw.call_args.kwargs["timeout"].read)
+        self.assertEqual(client.get_raw.call_count, 2)
+
+    async def test_batches_in_flight_recorded_when_middle_batch_fails(self):
+        async def import_generic_data(entity_id, reporting_period_id, template_id, batch, append):
+            if next(iter(batch))["col"] == 20:
+                raise UserException("Service unavailable")
+            await asyncio.sleep(0.1)
+            return {}
+
+        async with AsyncEsgClient("keboola.wr-esg-management-solution", "token") as client:
+            client.import_generic_data = mock.AsyncMock(side_effect=import_generic_data)
+            progress = BatchProgress()
+
+            with self.assertRaisesRegex(UserException, "Service unavailable"):
+                await client.import_generic_data_in_batches(
+                    1, 2, 3, [{"col": i} for i in range(70)], batch_size=10, max_concurrent_batches=4,
+                    progress=progress,
+                )
+
+        sent = sorted(next(iter(c.args[3]))["col"] for c in client.import_generic_data.call_args_list)
+        self.assertEqual(sent, [0, 10, 20, 30, 40])
+        self.assertEqual((progress.acknowledged, progress.completed), (2, {3, 4}))
+
+    async def test_batches_share_payload_builders(self):
+        payloads = []
+
+        async def post_raw(endpoint_path, content, **kwargs):
+            # the spooled body is streamed to httpx chunk by chunk
+            payloads.append(json.loads(b"".join([chunk async for chunk in content])))
+            return mock.Mock(status_code=200, text="", content=b"", headers={}, elapsed=timedelta(0))
+
+        async with AsyncEsgClient("keboola.wr-esg-management-solution", "token") as client:
+            client.post_raw = post_raw
+            rows = ({"col": i} for i in range(25))
+
+            results = await client.import_generic_data_in_batches(
+                1, 2, 3, rows, batch_size=10, max_concurrent_batches=2
+            )
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual([p["append"] for p in payloads], [False, True, True])
+        self.assertEqual(sum(len(p["templateData"]["rows"]) for p in payloads), 25)
+        self.assertEqual(payloads[0]["templateData"]["rows"][0], {"columns": [{"name": "col", "value": "0"}]})
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_cached_request_served_from_cache(self):
+        client = EsgClient("keboola.wr-esg-management-solution", "token", ResponseCache(ttl=60))
+        client._make_request = mock.Mock(return_value={"1": "Entity"})
+
+        self.assertEqual(client.get_entities("5"), {"1": "Entity"})
+        self.assertEqual(client.get_entities("5"), {"1": "Entity"})
+        client.get_entities("6")
+
+        self.assertEqual(client._make_request.call_count, 2)
+
+    def test_expired_entries_and_eviction(self):
+        cache = ResponseCache(ttl=60, max_entries=2)
+        with mock.patch("common.src.cache.time.time", return_value=1000):
+            cache.set("a", 1)
+        with mock.patch("common.src.cache.time.time", return_value=1050):
+            cache.set("b", 2)
+            cache.set("c", 3)
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), 2)
+        with mock.patch("common.src.cache.time.time", return_value=1200):
+            self.assertEqual(cache.to_dict(), {})
+
+    def test_invalidate_by_prefix(self):
+        cache = ResponseCache({"x?clientId=1": {"stored_at": 9e12, "value": 1}}, ttl=60)
+        cache.set("y", 2)
+
+        cache.invalidate("x")
+
+        self.assertIsNone(cache.get("x?clientId=1"))
+        self.assertEqual(cache.get("y"), 2)
+
+
+class TestIterJson(unittest.TestCase):
+    def test_generators_serialized_as_arrays(self):
+        rows = [{"a": "1", "b": None, "c": 1.5}, {"a": "ž\"", "b": True, "c": [1, 2]}]
+        payload = {"entityId": 1, "templateData": {"rows": (row for row in rows)}, "empty": iter([])}
+
+        body = b"".join(iter_json(payload, chunk_size=8))
+
+        self.assertEqual(json.loads(body), {"entityId": 1, "templateData": {"rows": rows}, "empty": []})
+
+    def test_chunks_are_bounded(self):
+        payload = {"rows": ({"value": str(i)} for i in range(10000))}
+
+        chunks = list(iter_json(payload, chunk_size=1024))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) < 2048 for chunk in chunks))
+
+    def test_all_backends_produce_same_json(self):
+        rows = [{"name": "ž", "value": "1.5"}, {"name": "b", "value": None}]
+        self.addCleanup(serialization.use_serializer)
+
+        for name in serialization.SERIALIZERS:
+            with self.subTest(backend=name):
+                serialization.use_serializer(name)
+                body = b"".join(iter_json({"rows": iter(rows), 1: "key"}))
+                self.assertEqual(serialization.loads(body), {"rows": rows, "1": "key"})
+
+    def test_generic_rows_serialized_like_cell_dicts(self):
+        rows = [{"a": "1", "b": 2.5}, {"b": None, "a": "ž"}, {"c": "3"}]
+
+        body = b"".join(iter_json({"rows": GenericRows.from_dicts(iter(rows))}))
+
+        expected = [{"columns": [{"name": k, "value": str(v)} for k, v in row.items()]} for row in rows]
+        self.assertEqual(json.loads(body), {"rows": expected})
+
+
+class TestCompressedBodies(unittest.TestCase):
+    def setUp(self):
+        self.client = EsgClient("keboola.wr-esg-management-solution", "token", content_encoding="gzip")
+        self.requests = []
+        self.statuses = []
+        self.error_text = ""
+
+    def post_raw(self, endpoint_path, data, headers, **kwargs):
+        self.requests.append((headers.get("Content-Encoding"), b"".join(data)))
+        status_code = self.statuses.pop(0)
+        text = self.error_text if status_code >= 400 else ""
+        return mock.Mock(status_code=status_code, text=text, content=b"", headers={}, elapsed=timedelta(0))
+
+    def test_body_compressed_while_sent(self):
+        body = SpooledBody(iter_json({"rows": [{"name": "column", "value": str(i)} for i in range(1000)]}))
+        body.content_encoding = "gzip"
+
+        compressed = b"".join(body)
+
+        self.assertEqual(len(json.loads(gzip.decompress(compressed))["rows"]), 1000)
+        self.assertEqual(body.sent_size, len(compressed))
+        self.assertLess(body.sent_size, body.size / 10)
+
+    def test_rejected_compression_falls_back_to_plain_json(self):
+        self.client.post_raw = self.post_raw
+        self.statuses = [415, 200, 200]
+
+        self.client.import_generic_data(1, 2, 3, [{"col": "1"}])
+        self.client.import_generic_data(1, 2, 3, [{"col": "2"}])
+
+        self.assertEqual([encoding for encoding, _ in self.requests], ["gzip", None, None])
+        self.assertEqual(json.loads(gzip.decompress(self.requests[0][1])), json.loads(self.requests[1][1]))
+        self.assertIsNone(self.client.content_encoding)
+
+    def test_encoding_error_falls_back_to_plain_json(self):
+        self.client.post_raw = self.post_raw
+        self.statuses = [400, 200]
+        self.error_text = "Unsupported Content-Encoding: gzip"
+
+        self.client.import_generic_data(1, 2, 3, [{"col": "1"}])
+
+        self.assertEqual([encoding for encoding, _ in self.requests], ["gzip", None])
+
+    def test_validation_error_not_retried_uncompressed(self):
+        self.client.post_raw = self.post_raw
+        self.statuses = [400]
+        self.error_text = '{"errors": {"templateData.rows[0].columns[0].value": ["The value is not a number."]}}'
+
+        with self.assertRaises(UserException):
+            self.client.import_generic_data(1, 2, 3, [{"col": "x"}])
+
+        self.assertEqual([encoding for encoding, _ in self.requests], ["gzip"])
+        self.assertEqual(self.client.content_encoding, "gzip")
+
+    def test_errors_after_accepted_compression_are_not_retried_uncompressed(self):
+        self.client.post_raw = self.post_raw
+        self.statuses = [200, 400]
+
+        self.client.import_generic_data(1, 2, 3, [{"col": "1"}])
+        with self.assertRaises(Exception):
+            self.client.import_generic_data(1, 2, 3, [{"col": "2"}])
+
+        self.assertEqual([encoding for encoding, _ in self.requests], ["gzip", "gzip"])
+
+
+if __name__ == "__main__":
+    unittest.main()
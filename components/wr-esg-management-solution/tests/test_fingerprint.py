@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from array import array
+
+from common.src.fingerprint import FingerprintIndex, RowDiff, row_digest
+
+
+def make_rows(count: int) -> list:
+    return [{"name": f"row {i}", "value": str(i)} for i in range(count)]
+
+
+class TestRowDiff(unittest.TestCase):
+    def setUp(self):
+        self.previous = array("Q", sorted(row_digest(row) for row in make_rows(100)))
+
+    def test_only_inserted_rows_are_sent(self):
+        rows = make_rows(105)
+
+        diff = RowDiff(self.previous, reversed(rows))
+
+        self.assertTrue(diff.complete)
+        self.assertCountEqual(diff.inserted, rows[100:])
+        self.assertEqual(len(diff.digests), 105)
+
+    def test_changed_row_requires_full_upload(self):
+        rows = make_rows(100)
+        rows[10] = {"name": "row 10", "value": "changed"}
+
+        self.assertFalse(RowDiff(self.previous, rows).complete)
+
+    def test_deleted_row_requires_full_upload(self):
+        rows = make_rows(105)
+        del rows[10]
+
+        self.assertFalse(RowDiff(self.previous, rows).complete)
+
+    def test_duplicated_row_requires_full_upload(self):
+        rows = make_rows(100) + [make_rows(1)[0]]
+
+        self.assertFalse(RowDiff(self.previous, rows).complete)
+
+    def test_too_many_changes_are_not_held(self):
+        diff = RowDiff(self.previous, make_rows(200), max_changed_rows=50)
+
+        self.assertIsNone(diff.inserted)
+        self.assertFalse(diff.complete)
+
+    def test_digest_ignores_column_order(self):
+        self.assertEqual(row_digest({"a": "1", "b": "2"}), row_digest({"b": "2", "a": "1"}))
+
+
+class TestFingerprintIndex(unittest.TestCase):
+    def test_saved_index_is_loaded(self):
+        index = FingerprintIndex(settings="normalize_values=False")
+        index.set("1-2-3", [3, 1, 2])
+        index.set("1-2-4", [])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "row_fingerprints.zip")
+            index.save(path)
+            loaded = FingerprintIndex.load(path, "normalize_values=False")
+
+        self.assertEqual(list(loaded.get("1-2-3")), [1, 2, 3])
+        self.assertEqual(list(loaded.get("1-2-4")), [])
+        self.assertIsNone(loaded.get("1-2-5"))
+
+    def test_entries_with_other_settings_are_ignored(self):
+        index = FingerprintIndex(settings="normalize_values=False")
+        index.set("1-2-3", [3, 1, 2])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "row_fingerprints.zip")
+            index.save(path)
+            loaded = FingerprintIndex.load(path, "normalize_values=True")
+            loaded.set("1-2-4", [5])
+            loaded.save(path)
+
+            self.assertIsNone(loaded.get("1-2-3"))
+            # entries recorded with other settings are kept for the runs using them
+            self.assertEqual(list(FingerprintIndex.load(path, "normalize_values=False").get("1-2-3")), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
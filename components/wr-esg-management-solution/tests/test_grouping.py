@@ -0,0 +1,58 @@
+import unittest
+
+from keboola.component.exceptions import UserException
+
+from grouping import Level, group_rows
+
+LEVELS = [
+    Level("country", lambda country, row: {"country": country, "cities": []}, children="cities"),
+    Level(
+        "city",
+        lambda city, row: {"city": city, "total": 0},
+        add=lambda node, row: node.update(total=node["total"] + int(row["count"])),
+    ),
+]
+
+
+def make_row(country: str, city: str, count: int) -> dict:
+    return {"country": country, "city": city, "count": str(count)}
+
+
+class TestGroupRows(unittest.TestCase):
+    def test_groups_in_order_of_first_appearance(self):
+        rows = [make_row("CZ", "Prague", 1), make_row("DE", "Berlin", 2), make_row("CZ", "Brno", 3),
+                make_row("CZ", "Prague", 4)]
+
+        result = list(group_rows(rows, LEVELS))
+
+        self.assertEqual(
+            result,
+            [
+                {"country": "CZ", "cities": [{"city": "Prague", "total": 5}, {"city": "Brno", "total": 3}]},
+                {"country": "DE", "cities": [{"city": "Berlin", "total": 2}]},
+            ],
+        )
+
+    def test_presorted_groups_yielded_when_complete(self):
+        consumed = []
+
+        def rows():
+            for row in [make_row("CZ", "Prague", 1), make_row("CZ", "Brno", 1), make_row("DE", "Berlin", 1)]:
+                consumed.append(row)
+                yield row
+
+        groups = group_rows(rows(), LEVELS, presorted=True)
+
+        self.assertEqual(next(groups)["country"], "CZ")
+        self.assertEqual(len(consumed), 3)
+        self.assertEqual(next(groups)["country"], "DE")
+
+    def test_unsorted_input_rejected_in_presorted_mode(self):
+        rows = [make_row("CZ", "Prague", 1), make_row("DE", "Berlin", 1), make_row("CZ", "Brno", 1)]
+
+        with self.assertRaises(UserException):
+            list(group_rows(rows, LEVELS, presorted=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+
+import mock
+
+from common.src.esg_client import EsgClient
+from common.src.metrics import PerformanceMetrics, get_server_time
+from common.tests.mock_server import MockEsgServer
+
+
+def slow_rows(count: int, delay: float):
+    for i in range(count):
+        time.sleep(delay)
+        yield {"value": i}
+
+
+class TestPerformanceMetrics(unittest.TestCase):
+    def test_nested_stages_timed_exclusively(self):
+        metrics = PerformanceMetrics()
+
+        with metrics.stage("serialize"):
+            rows = metrics.timed(slow_rows(5, 0.01), "csv_read")
+            transformed = metrics.timed(({**row, "double": row["value"] * 2} for row in rows), "transform")
+            list(transformed)
+
+        stages = metrics.summary()["stages"]
+        self.assertGreaterEqual(stages["csv_read"]["seconds"], 0.05)
+        self.assertEqual(stages["csv_read"]["rows"], 5)
+        self.assertLess(stages["transform"]["seconds"], 0.02)
+        self.assertLess(stages["serialize"]["seconds"], 0.02)
+
+    def test_server_time_from_server_timing_header(self):
+        response = mock.Mock(headers={"Server-Timing": "db;dur=20, total;dur=125.5"}, elapsed=timedelta(seconds=1))
+        self.assertEqual(get_server_time(response), 0.1255)
+
+        response = mock.Mock(headers={}, elapsed=timedelta(seconds=1))
+        self.assertEqual(get_server_time(response), 1.0)
+
+    def test_client_requests_reported_per_endpoint(self):
+        metrics = PerformanceMetrics()
+        with MockEsgServer() as server:
+            client = EsgClient("keboola.wr-esg-management-solution", "token", metrics=metrics)
+            client.base_url = server.api_url
+            client.get_lookup_data("Country")
+            client.import_generic_data(1, 2, 3, [{"name": f"row {i}"} for i in range(100)])
+
+        summary = metrics.summary()
+        self.assertEqual(summary["stages"]["http_send"]["calls"], 2)
+        self.assertEqual(summary["stages"]["http_send"]["bytes_sent"], server.stats()["bytes_sent"])
+        self.assertEqual(summary["stages"]["serialize"]["calls"], 1)
+        self.assertEqual(summary["endpoints"]["ExternalIntegration/LookupData/GetLookupData"]["calls"], 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "performance_report.csv")
+            metrics.write_report(path)
+            with open(path) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(
+            [(row["stage"], row["endpoint"]) for row in rows],
+            [
+                ("http_send", ""),
+                ("serialize", ""),
+                ("http_send", "ExternalIntegration/LookupData/GetLookupData"),
+                ("http_send", "ExternalIntegration/TemplateData/ImportGenericData"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
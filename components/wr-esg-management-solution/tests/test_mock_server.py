@@ -0,0 +1,72 @@
+import unittest
+
+from keboola.component.exceptions import UserException
+
+from common.src.esg_client import EsgClient
+from common.src.rate_limit import RetryPolicy
+from common.src.token_provider import TokenProvider
+from common.tests.mock_server import MockEsgServer
+
+COMPONENT_ID = "keboola.wr-esg-management-solution"
+
+
+class TestMockEsgServer(unittest.TestCase):
+    def create_client(self, server: MockEsgServer, **kwargs) -> EsgClient:
+        client = EsgClient(COMPONENT_ID, "token", retry_policy=RetryPolicy(backoff_factor=0.01), **kwargs)
+        client.base_url = server.api_url
+        return client
+
+    def test_client_reads_and_imports(self):
+        with MockEsgServer(keep_payloads=True) as server:
+            client = self.create_client(server)
+
+            clients = client.get_clients()
+            client.import_generic_data(1, 2, 3, [{"name": "a", "value": "1"}])
+
+        self.assertEqual(clients[0], {"id": 1, "name": "Client 1"})
+        path, payload = server.payloads[0]
+        self.assertEqual(path, "ExternalIntegration/TemplateData/ImportGenericData")
+        self.assertEqual(payload["templateData"]["rows"], [{"columns": [
+            {"name": "name", "value": "a"}, {"name": "value", "value": "1"}]}])
+
+    def test_throttled_and_failed_requests_retried(self):
+        with MockEsgServer(throttle_rate=0.3, error_rate=0.2, seed=1) as server:
+            client = self.create_client(server)
+
+            for _ in range(10):
+                client.get_lookup_data("Country")
+
+        stats = server.stats()
+        self.assertGreater(stats["status_codes"].get(429, 0) + stats["status_codes"].get(500, 0), 0)
+        self.assertEqual(stats["status_codes"][200], 10)
+
+    def test_compressed_body_decoded(self):
+        with MockEsgServer() as server:
+            client = self.create_client(server, content_encoding="gzip")
+            rows = [{"name": f"row {i}", "value": "1"} for i in range(1000)]
+
+            client.import_generic_data(1, 2, 3, rows)
+
+        self.assertEqual(server.stats()["bytes_received"], client.bytes_serialized)
+        self.assertLess(server.stats()["bytes_sent"], server.stats()["bytes_received"])
+
+    def test_payload_over_limit_rejected(self):
+        with MockEsgServer(max_payload_bytes=100) as server:
+            client = self.create_client(server)
+
+            with self.assertRaises(UserException):
+                client.import_generic_data(1, 2, 3, [{"name": "x" * 200}])
+
+    def test_token_url_injected(self):
+        with MockEsgServer() as server:
+            state = {}
+            provider = TokenProvider(state, "auth", "key", "secret", "refresh", token_url=server.token_url)
+
+            provider.get_id_token()
+
+        self.assertEqual(state["#refresh_token"], "mock-refresh-token")
+        self.assertGreater(state["id_token_expires_at"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+import mock
+
+from common.src.profiling import RunProfiler
+
+
+def busy_loop(seconds: float) -> list:
+    allocated = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        allocated.append(str(len(allocated)))
+    return allocated
+
+
+class TestRunProfiler(unittest.TestCase):
+    def test_results_written_to_out_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            component = mock.Mock()
+            component.create_out_file_definition.side_effect = lambda name, tags: mock.Mock(
+                full_path=os.path.join(tmp, name)
+            )
+
+            with RunProfiler(component):
+                busy_loop(0.1)
+
+            self.assertEqual(sorted(os.listdir(tmp)), ["allocations.txt", "profile.collapsed", "profile.pstats"])
+            self.assertEqual(component.write_manifest.call_count, 3)
+
+            functions = {function for _, _, function in pstats.Stats(os.path.join(tmp, "profile.pstats")).stats}
+            self.assertIn("busy_loop", functions)
+            with open(os.path.join(tmp, "profile.collapsed")) as f:
+                stacks = f.read().splitlines()
+            self.assertTrue(any("busy_loop(test_profiling.py" in stack for stack in stacks))
+            self.assertTrue(all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks))
+            with open(os.path.join(tmp, "allocations.txt")) as f:
+                self.assertIn("test_profiling.py", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import unittest
+from datetime import timedelta
+
+import httpx
+import mock
+from keboola.component.exceptions import UserException
+
+from common.src.async_esg_client import AsyncEsgClient
+from common.src.esg_client import EsgClient
+from common.src.rate_limit import AimdConcurrencyLimiter, RetryPolicy
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_retry_after_takes_precedence(self):
+        policy = RetryPolicy(max_backoff=30)
+
+        self.assertEqual(policy.get_delay(0, "7"), 7)
+        self.assertEqual(policy.get_delay(0, "120"), 30)
+        self.assertEqual(policy.get_delay(0, "Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+    def test_jittered_backoff_is_bounded(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=10)
+
+        for attempt in range(8):
+            self.assertTrue(0 <= policy.get_delay(attempt) <= min(10, 2**attempt))
+
+    def test_retries_only_listed_statuses(self):
+        policy = RetryPolicy(max_retries=2)
+
+        self.assertTrue(policy.should_retry(429, 1))
+        self.assertFalse(policy.should_retry(429, 2))
+        self.assertFalse(policy.should_retry(400, 0))
+
+    def test_non_idempotent_requests_retried_only_when_refused(self):
+        policy = RetryPolicy()
+
+        self.assertTrue(policy.should_retry(429, 0, idempotent=False))
+        self.assertTrue(policy.should_retry(503, 0, idempotent=False, retry_after="5"))
+        self.assertFalse(policy.should_retry(503, 0, idempotent=False))
+        for status_code in (500, 502, 504):
+            self.assertTrue(policy.should_retry(status_code, 0))
+            self.assertFalse(policy.should_retry(status_code, 0, idempotent=False, retry_after="5"))
+
+
+class TestAimdConcurrencyLimiter(unittest.TestCase):
+    def test_throttling_halves_and_success_recovers_limit(self):
+        limiter = AimdConcurrencyLimiter(max_limit=8)
+
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in range(30):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.limit, 8)
+
+    def test_limit_never_drops_below_minimum(self):
+        limiter = AimdConcurrencyLimiter(max_limit=4, min_limit=2)
+
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(throttled=True)
+
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+class TestAimdConcurrencyLimiterAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_waiting_coroutine_woken_by_release(self):
+        limiter = AimdConcurrencyLimiter(max_limit=1)
+        await limiter.acquire_async()
+
+        waiting = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+
+        limiter.release()
+        await asyncio.wait_for(waiting, timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_release_from_other_thread_wakes_coroutine(self):
+        limiter = AimdConcurrencyLimiter(max_limit=1)
+        limiter.acquire()
+
+        waiting = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        await asyncio.to_thread(limiter.release)
+
+        await asyncio.wait_for(waiting, timeout=1)
+        self.assertEqual(limiter.in_flight, 1)
+
+    async def test_cancelled_waiter_does_not_take_slot(self):
+        limiter = AimdConcurrencyLimiter(max_limit=1)
+        await limiter.acquire_async()
+
+        waiting = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        limiter.release()
+        await asyncio.sleep(0)
+
+        self.assertEqual(limiter.in_flight, 0)
+
+
+class TestEsgClientRetries(unittest.TestCase):
+    @mock.patch("common.src.esg_client.time.sleep")
+    def test_throttled_import_is_retried_with_same_body(self, sleep):
+        client = EsgClient("keboola.wr-esg-management-solution", "token")
+        bodies = []
+
+        def post_raw(endpoint_path, data, **kwargs):
+            bodies.append(b"".join(data))
+            if len(bodies) == 1:
+                return mock.Mock(status_code=429, content=b"", headers={"Retry-After": "2"}, elapsed=timedelta(0))
+            return mock.Mock(status_code=200, text="", content=b"", headers={}, elapsed=timedelta(0))
+
+        client.post_raw = post_raw
+        rows = ({"col": i} for i in range(3))
+
+        result = client.import_generic_data(1, 2, 3, rows)
+
+        self.assertEqual(result["status"], "success")
+        sleep.assert_called_once_with(2.0)
+        self.assertEqual(bodies[0], bodies[1])
+        self.assertEqual(len(json.loads(bodies[1])["templateData"]["rows"]), 3)
+        self.assertLess(client.rate_limiter.concurrency.limit, 10)
+
+    @mock.patch("common.src.esg_client.time.sleep")
+    def test_append_batch_sent_once_after_gateway_timeout(self, sleep):
+        client = EsgClient("keboola.wr-esg-management-solution", "token")
+        client.post_raw = mock.Mock(
+            return_value=mock.Mock(status_code=504, text="", content=b"", headers={}, elapsed=timedelta(0))
+        )
+
+        with self.assertRaises(UserException):
+            client.import_generic_data(1, 2, 3, [{"col": "1"}], append=True)
+
+        self.assertEqual(client.post_raw.call_count, 1)
+        sleep.assert_not_called()
+
+
+class TestAsyncEsgClientRetries(unittest.IsolatedAsyncioTestCase):
+    async def test_append_batch_sent_once_after_gateway_timeout(self):
+        request = httpx.Request("POST", "https://esg.test/api/ExternalIntegration/TemplateData/ImportGenericData")
+        error = httpx.HTTPStatusError("Gateway Timeout", request=request, response=httpx.Response(504, request=request))
+
+        async with AsyncEsgClient("keboola.wr-esg-management-solution", "token") as client:
+            client.post_raw = mock.AsyncMock(side_effect=error)
+
+            with self.assertRaises(UserException):
+                await client.import_generic_data(1, 2, 3, [{"col": "1"}], append=True)
+
+        self.assertEqual(client.post_raw.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from table_reader import read_csv_rows
+
+CSV_CONTENT = 'name,value,comment\na,1,\n"b, c",2,"multi\nline"\n\nž,3\nd,4,x,extra\n'
+
+
+class TestReadCsvRows(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "in.csv")
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(CSV_CONTENT)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def dict_reader_rows(self) -> list:
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            return list(csv.DictReader(f))
+
+    def test_rows_read_like_dict_reader(self):
+        self.assertEqual(list(read_csv_rows(self.path)), self.dict_reader_rows())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import base64
+import json
+import time
+import unittest
+
+import mock
+
+from common.src.token_provider import TokenProvider
+
+
+def make_id_token(exp: float) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{claims}.signature"
+
+
+class TestTokenProvider(unittest.TestCase):
+    def setUp(self):
+        self.id_token = make_id_token(time.time() + 3600)
+        self.response = mock.Mock(status_code=200)
+        self.response.json.return_value = {"refresh_token": "new-refresh", "id_token": self.id_token}
+
+    @mock.patch("common.src.token_provider.requests.Session.post")
+    def test_token_reused_until_expiry(self, post):
+        post.return_value = self.response
+        state = {}
+
+        provider = TokenProvider(state, "auth", "key", "secret", "config-refresh")
+        self.assertEqual(provider.get_id_token(), self.id_token)
+        self.assertTrue(provider.refreshed)
+        self.assertEqual(post.call_args.kwargs["data"]["refresh_token"], "config-refresh")
+
+        provider = TokenProvider(state, "auth", "key", "secret", "config-refresh")
+        self.assertEqual(provider.get_id_token(), self.id_token)
+        self.assertFalse(provider.refreshed)
+        self.assertEqual(post.call_count, 1)
+
+    @mock.patch("common.src.token_provider.requests.Session.post")
+    def test_token_refreshed_ahead_of_expiry(self, post):
+        post.return_value = self.response
+        state = {
+            "#refresh_token": "state-refresh",
+            "auth_id": "auth",
+            "#id_token": "old",
+            "id_token_expires_at": time.time() + 60,
+        }
+
+        provider = TokenProvider(state, "auth", "key", "secret", "config-refresh")
+
+        self.assertEqual(provider.get_id_token(), self.id_token)
+        self.assertEqual(post.call_args.kwargs["data"]["refresh_token"], "state-refresh")
+        self.assertEqual(state["#refresh_token"], "new-refresh")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from datetime import date
+
+from common.src.validation import TemplateValidator
+
+TEMPLATE = {
+    "columnsConfiguration": [
+        {"columnType": "Text", "dbColumnName": "Name", "isRequired": True},
+        {"columnType": "Lookup", "dbColumnName": "Country", "lookupName": "Countries"},
+        {"columnType": "Number", "dbColumnName": "Share", "numberCondition": "Percentage"},
+        {"columnType": "Number", "dbColumnName": "Count", "numberCondition": "PositiveInteger"},
+        {"columnType": "Number", "dbColumnName": "Loss", "numberCondition": "NegativeOrZero"},
+        {"columnType": "Number", "dbColumnName": "Balance", "numberCondition": "Positive Or Zero"},
+        {"columnType": "Date", "dbColumnName": "Date", "mustBeInPeriod": "True"},
+        {"columnType": "Number", "dbColumnName": "Free", "disableValidation": True},
+    ]
+}
+
+
+class TestTemplateValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = TemplateValidator(TEMPLATE, {"Countries": {"CZ", "DE"}})
+
+    def test_valid_row(self):
+        row = {"Name": "a", "Country": "CZ", "Share": "12.5", "Count": "3", "Date": "2024-05-01", "Free": "x"}
+
+        self.assertEqual(self.validator.check(row), ([], []))
+
+    def test_invalid_row_reports_every_column(self):
+        row = {"Name": "", "Country": "XX", "Share": "120", "Count": "1.5", "Loss": "nan", "Date": "2024-13-01"}
+
+        errors, warnings = self.validator.check(row)
+
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(warnings, ["Date: value '2024-13-01' is not a date in a known format, it was not checked"])
+
+    def test_number_conditions_matched_exactly(self):
+        self.assertEqual(self.validator.validate({"Loss": "-5"}), [])
+        self.assertEqual(self.validator.validate({"Loss": "0"}), [])
+        self.assertEqual(self.validator.validate({"Loss": "5"}), ["Loss: value '5' must not be positive"])
+        self.assertEqual(self.validator.validate({"Balance": "0"}), [])
+        self.assertEqual(self.validator.validate({"Balance": "-1"}), ["Balance: value '-1' must not be negative"])
+
+    def test_unknown_number_condition_not_checked(self):
+        template = {"columnsConfiguration": [{"columnType": "Number", "dbColumnName": "A", "numberCondition": "Odd"}]}
+
+        with self.assertLogs(level="WARNING") as logs:
+            validator = TemplateValidator(template)
+
+        self.assertIn("Number condition 'Odd' of column A is not checked locally", logs.output[0])
+        self.assertEqual(validator.validate({"A": "-2"}), [])
+        self.assertEqual(validator.validate({"A": "x"}), ["A: value 'x' is not a number"])
+
+    def test_dates_checked_against_period(self):
+        validator = TemplateValidator(TEMPLATE, period_start=date(2024, 1, 1), period_end=date(2024, 12, 31))
+
+        for value in ("2024-01-01", "2024-12-31T23:59:59+01:00", "31.12.2024", "06/30/2024"):
+            self.assertEqual(validator.check({"Date": value}), ([], []), value)
+        self.assertEqual(
+            validator.validate({"Date": "2025-01-01"}), ["Date: date 2025-01-01 is outside of the reporting period"]
+        )
+        self.assertTrue(validator.checks_period)
+
+    def test_lookup_names_and_invalid_rows(self):
+        rows = [{"Name": "a"}, {"Name": ""}, {"Name": "b", "Count": "-1"}, {"Name": "c", "Date": "May 2024"}]
+
+        self.assertEqual(TemplateValidator.get_lookup_names(TEMPLATE), {"Countries"})
+        invalid_rows = list(self.validator.find_invalid_rows(rows))
+        self.assertEqual([r[0] for r in invalid_rows], [2, 3, 4])
+        # rows with only warnings are reported, but valid
+        self.assertEqual(
+            invalid_rows[2][2:], ([], ["Date: value 'May 2024' is not a date in a known format, it was not checked"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()